@@ -0,0 +1,200 @@
+# Throughput benchmarks for the main model stages. PHREEQC is replaced by the stand-in executable
+# next to this file unless --phreeqc points at a directory holding a real build, so the numbers
+# measure KAMINO's own overhead (deck building, process start, file I/O, parsing, solver iterations)
+# on any Linux machine. Every benchmark runs in a scratch directory that links the repository's
+# input/ folder, with profiling enabled, and the timings and profiling reports are written as JSON;
+# --compare prints the change in throughput against an earlier results file.
+#
+#   python benchmarks/run_benchmarks.py --output results.json
+#   python benchmarks/run_benchmarks.py --compare results.json --only find_partial_pressures
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARK_path = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_path = os.path.dirname(BENCHMARK_path)
+
+sys.path.insert(0, os.path.join(REPOSITORY_path, 'src', 'KAMINO'))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+
+import profiling
+from constants import EARTH_ATM
+from external import phreeqc
+
+
+def bench_find_partial_pressures(n: int=50) -> int:
+
+    composition = {'Cl': 0.546, 'Na': 0.469, 'Mg': 0.0528, 'Ca': 0.0103}
+
+    for T in np.linspace(275, 320, n):
+        phreeqc.find_partial_pressures(EARTH_ATM, T, composition, alkalinity=0.0023, carbon_molality=0.002)
+
+    return n
+
+def bench_find_partial_pressures_batch(n: int=1000) -> int:
+
+    composition = {'Cl': 0.546, 'Na': 0.469, 'Mg': 0.0528, 'Ca': 0.0103}
+    phreeqc.find_partial_pressures_batch(EARTH_ATM, np.linspace(275, 320, n), composition, alkalinity=0.0023, carbon_molality=0.002)
+
+    return n
+
+def bench_ocean_setup(n: int=10) -> int:
+
+    from ocean import ocean
+
+    for P_CO2 in np.logspace(1, 3, n):
+        o = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+        o.setup(P_CO2, 0.002)
+
+    return n
+
+def bench_ocean_setup_unfused(n: int=2) -> int:
+
+    from ocean import ocean
+
+    for P_CO2 in np.logspace(1, 3, n):
+        o = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+        o.setup(P_CO2, 0.002, fused=False)
+
+    return n
+
+def bench_make_adiabat(num: int=10) -> int:
+
+    from external.sf_EOS import make_adiabat
+
+    make_adiabat(EARTH_ATM, 280, 4e7, 0.5, num)
+
+    return num
+
+def bench_make_adiabat_batch(n: int=20, num: int=100) -> int:
+
+    from external.sf_EOS import make_adiabat_batch
+
+    make_adiabat_batch(EARTH_ATM, np.linspace(275, 300, n), 4e7, 0.5, num)
+
+    return n * num
+
+def bench_heat_profile(n: int=10_000) -> int:
+
+    from ocean_heat_profile import temperature_profiles
+
+    temperature_profiles(np.linspace(270, 310, n), np.linspace(100, 400, n))
+
+    return n
+
+def bench_plot_mineral(n_P: int=6, n_T: int=6) -> int:
+
+    from sweep import run_sweep
+    from weathering_plots import mineral_feedback, plot_mineral
+
+    grid = {'P_seafloor': np.linspace(100, 2000, n_P) * EARTH_ATM, 'T_seafloor': np.linspace(275, 400, n_T)}
+
+    shutil.rmtree('sweeps/Calcite', ignore_errors=True)
+    run_sweep('sweeps/Calcite', grid, mineral_feedback, kwargs={'mineral': 'Calcite', 'alkalinity': 0.0023}, chunk_size=12, vectorized=True, max_workers=1)
+    plot_mineral('Calcite', 'sweeps/Calcite')
+
+    return n_P * n_T
+
+BENCHMARKS = {
+    'find_partial_pressures': bench_find_partial_pressures,
+    'find_partial_pressures_batch': bench_find_partial_pressures_batch,
+    'ocean_setup': bench_ocean_setup,
+    'ocean_setup_unfused': bench_ocean_setup_unfused,
+    'make_adiabat': bench_make_adiabat,
+    'make_adiabat_batch': bench_make_adiabat_batch,
+    'heat_profile': bench_heat_profile,
+    'plot_mineral': bench_plot_mineral
+}
+
+# benchmarks that need SeaFreeze, skipped when it is not installed
+SEAFREEZE_BENCHMARKS = ('make_adiabat', 'make_adiabat_batch')
+
+
+def run_benchmark(name: str, repeat: int) -> dict:
+
+    times = []
+    profile = {}
+
+    for _ in range(repeat):
+        profiling.reset()
+        start = time.perf_counter()
+        items = BENCHMARKS[name]()
+        times.append(time.perf_counter() - start)
+        profile = profiling.report()
+
+    return {
+        'items': items,
+        'best': min(times),
+        'mean': sum(times) / len(times),
+        'throughput': items / min(times),
+        'profile': profile
+    }
+
+def seafreeze_available() -> bool:
+
+    try:
+        import seafreeze # type: ignore
+    except ImportError:
+        return False
+
+    return True
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description='KAMINO throughput benchmarks')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='benchmarks to run, all by default')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best one is reported')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='earlier results file to compare the throughput with')
+    parser.add_argument('--phreeqc', default=BENCHMARK_path, help='directory with the phreeqc executable, the stand-in by default')
+    args = parser.parse_args()
+
+    names = args.only if args.only else list(BENCHMARKS)
+    if not seafreeze_available():
+        skipped = [name for name in names if name in SEAFREEZE_BENCHMARKS]
+        if skipped:
+            print(f"SeaFreeze is not installed, skipping {', '.join(skipped)}")
+        names = [name for name in names if name not in SEAFREEZE_BENCHMARKS]
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)['benchmarks']
+
+    output = None if args.output is None else os.path.abspath(args.output)
+
+    phreeqc.PHREEQC_path = os.path.abspath(args.phreeqc)
+    profiling.enable()
+
+    work_path = tempfile.mkdtemp(prefix='kamino_benchmarks_')
+    os.symlink(os.path.join(REPOSITORY_path, 'input'), os.path.join(work_path, 'input'))
+    os.chdir(work_path)
+
+    results = {}
+
+    try:
+        print(f"{'benchmark':<30} {'items':>8} {'best (s)':>10} {'items/s':>12}")
+        for name in names:
+            results[name] = run_benchmark(name, args.repeat)
+            line = f"{name:<30} {results[name]['items']:>8} {results[name]['best']:>10.4f} {results[name]['throughput']:>12.2f}"
+            if name in baseline:
+                line += f"  {results[name]['throughput'] / baseline[name]['throughput']:>6.2f}x"
+            print(line)
+    finally:
+        os.chdir(REPOSITORY_path)
+        shutil.rmtree(work_path, ignore_errors=True)
+
+    if output is not None:
+        with open(output, 'w') as file:
+            json.dump({'phreeqc': phreeqc.PHREEQC_path, 'repeat': args.repeat, 'benchmarks': results}, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
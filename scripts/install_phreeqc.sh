@@ -12,4 +12,17 @@ mkdir Release
 cd Release
 ../configure --prefix=$INSTALLDIR
 make
-make install
\ No newline at end of file
+make install
+
+# unpacks and installs IPhreeqc (shared library for the in-process backend) when its source is present
+cd ../..
+
+if [ -f iphreeqc-3.8.6-17100.tar.gz ]; then
+    tar -xvzf iphreeqc-3.8.6-17100.tar.gz
+    cd iphreeqc-3.8.6-17100
+    mkdir Release
+    cd Release
+    ../configure --prefix=$INSTALLDIR
+    make
+    make install
+fi
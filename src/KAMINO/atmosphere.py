@@ -1,73 +1,182 @@
 import numpy as np
 
+from collections.abc import Iterator, MutableMapping
+from typing import Union
+from numpy.typing import ArrayLike
+
 from constants import SPECIES_MMW
 
-class atmosphere:
-    
-    def __init__(self, gravity: float, area: float, P_surface: float, x_gas: dict[str, float]):
-        
-        self.gravity = gravity
-        self.area = area
-        self.x_gas = x_gas
-        self.P_surface = P_surface
-
-        self.P_gas: dict[str, float] = {}
+class atmosphere_ensemble:
+
+    # N atmospheres with the same species, every gas quantity is an (N, n_species) array;
+    # the batch operations act on all atmospheres or on the ones selected by rows
+    def __init__(self, gravity: ArrayLike, area: ArrayLike, P_surface: ArrayLike, x_gas: dict[str, ArrayLike]):
+
+        self.species = list(x_gas.keys())
+        self.species_index = {species: j for j, species in enumerate(self.species)}
+        self.species_mmw = np.array([SPECIES_MMW[species] for species in self.species])
+
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in [gravity, area, P_surface, *x_gas.values()]])
+
+        self.gravity = arrays[0].copy()
+        self.area = arrays[1].copy()
+        self.P_surface = arrays[2].copy()
+        self.x_gas = np.stack(arrays[3:], axis=1)
+
+        self.P_gas = np.empty_like(self.x_gas)
         self.calculate_P_gas()
-        
-        self.mmw = 0
+
+        self.mmw = np.empty_like(self.P_surface)
         self.calulate_mmw()
 
-        self.mass = (self.P_surface * self.area) / self.gravity
         self.moles = self.mass / self.mmw
 
-        self.n_gas: dict[str, float] = {}
+        self.n_gas = np.empty_like(self.x_gas)
         self.calculate_n_gas()
 
+    def __len__(self) -> int:
+        return len(self.P_surface)
+
+    def __getitem__(self, i: int) -> 'atmosphere':
+        # the atmosphere of one member, reading and writing this ensemble
+        i = range(len(self))[i]
+        x_gas = {species: self.x_gas[i, j] for j, species in enumerate(self.species)}
+        return atmosphere(self.gravity[i], self.area[i], self.P_surface[i], x_gas, ensemble=self, row=i)
+
+    @property
+    def mass(self) -> np.ndarray:
+        return (self.P_surface * self.area) / self.gravity
+
+    def calculate_P_gas(self, rows: Union[slice, ArrayLike]=slice(None)):
+        self.P_gas[rows] = self.x_gas[rows] * self.P_surface[rows, None]
+
+    def calculate_n_gas(self, rows: Union[slice, ArrayLike]=slice(None)):
+        self.n_gas[rows] = self.x_gas[rows] * self.moles[rows, None]
+
+    def calulate_mmw(self, rows: Union[slice, ArrayLike]=slice(None)):
+        self.mmw[rows] = self.x_gas[rows] @ self.species_mmw
+
+    def add_species(self, amount: ArrayLike, added_species: str, rows: Union[slice, ArrayLike]=slice(None)):
+
+        j = self.species_index[added_species]
+
+        self.n_gas[rows, j] += amount
+        self.moles[rows] += amount
+        self.P_surface[rows] += (np.asarray(amount) * SPECIES_MMW[added_species] * self.gravity[rows]) / self.area[rows]
+
+        self.x_gas[rows] = self.n_gas[rows] / self.moles[rows, None]
+
+        self.calulate_mmw(rows)
+        self.calculate_P_gas(rows)
+
+    def set_partial_pressure(self, new_partial_pressure: ArrayLike, modified_species: str, rows: Union[slice, ArrayLike]=slice(None)):
+
+        j = self.species_index[modified_species]
+
+        delta_P = new_partial_pressure - self.P_surface[rows] * self.x_gas[rows, j]
+        self.P_surface[rows] += delta_P
+        self.P_gas[rows, j] = new_partial_pressure
+
+        self.x_gas[rows] = self.P_gas[rows] / self.P_surface[rows, None]
+        self.calulate_mmw(rows)
+
+        delta_n = (delta_P * self.area[rows]) / (SPECIES_MMW[modified_species] * self.gravity[rows])
+        self.moles[rows] += delta_n
+
+        self.calculate_n_gas(rows)
+
+class _species_row(MutableMapping):
+
+    # dict-like access to one row of an (N, n_species) ensemble array
+    def __init__(self, ensemble: atmosphere_ensemble, name: str, row: int):
+        self.ensemble = ensemble
+        self.name = name
+        self.row = row
+
+    def __getitem__(self, species: str) -> float:
+        return float(getattr(self.ensemble, self.name)[self.row, self.ensemble.species_index[species]])
+
+    def __setitem__(self, species: str, value: float):
+        getattr(self.ensemble, self.name)[self.row, self.ensemble.species_index[species]] = value
+
+    def __delitem__(self, species: str):
+        raise TypeError("Species cannot be removed from an atmosphere")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ensemble.species)
+
+    def __len__(self) -> int:
+        return len(self.ensemble.species)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+class atmosphere:
+
+    # a single atmosphere is a view onto one row of an ensemble, a new one gets an ensemble of its own;
+    # with an ensemble given the other arguments are ignored
+    def __init__(self, gravity: float, area: float, P_surface: float, x_gas: dict[str, float], ensemble: Union[atmosphere_ensemble, None]=None, row: int=0):
+
+        self.ensemble = atmosphere_ensemble(gravity, area, P_surface, x_gas) if ensemble is None else ensemble
+        self.row = row
+        self.rows = slice(row, row + 1)
+
+        self.x_gas = _species_row(self.ensemble, 'x_gas', row)
+        self.P_gas = _species_row(self.ensemble, 'P_gas', row)
+        self.n_gas = _species_row(self.ensemble, 'n_gas', row)
+
         n_layers = 30
 
         self.P = np.empty(n_layers, dtype=np.float64)
         self.T = np.empty(n_layers, dtype=np.float64)
         self.z = np.empty(n_layers, dtype=np.float64)
 
+    @property
+    def gravity(self) -> float:
+        return float(self.ensemble.gravity[self.row])
+
+    @property
+    def area(self) -> float:
+        return float(self.ensemble.area[self.row])
+
+    @property
+    def P_surface(self) -> float:
+        return float(self.ensemble.P_surface[self.row])
+
+    @P_surface.setter
+    def P_surface(self, value: float):
+        self.ensemble.P_surface[self.row] = value
+
+    @property
+    def mmw(self) -> float:
+        return float(self.ensemble.mmw[self.row])
+
+    @property
+    def moles(self) -> float:
+        return float(self.ensemble.moles[self.row])
+
+    @moles.setter
+    def moles(self, value: float):
+        self.ensemble.moles[self.row] = value
+
+    @property
+    def mass(self) -> float:
+        return float(self.ensemble.mass[self.row])
+
     def calculate_P_gas(self):
-        for species in self.P_gas.keys():
-            self.P_gas[species] = self.x_gas[species] * self.P_surface
+        self.ensemble.calculate_P_gas(self.rows)
 
     def calculate_n_gas(self):
-        for species in self.x_gas.keys():
-            self.n_gas[species] = self.x_gas[species] * self.moles
+        self.ensemble.calculate_n_gas(self.rows)
 
     def calulate_mmw(self):
-        self.mmw = 0
-        for species in self.x_gas.keys():
-            self.mmw += self.x_gas[species] * SPECIES_MMW[species]
+        self.ensemble.calulate_mmw(self.rows)
 
     def add_species(self, amount: float, added_species: str):
-
-        self.n_gas[added_species] += amount
-        self.moles += amount
-        self.P_surface += (amount * SPECIES_MMW[added_species] * self.gravity) / self.area
-        
-        for species in self.x_gas.keys():
-            self.x_gas[species] = self.n_gas[species] / self.moles
-
-        self.calulate_mmw()
-        self.calculate_P_gas()
+        self.ensemble.add_species(amount, added_species, self.rows)
 
     def set_partial_pressure(self, new_partial_pressure: float, modified_species: str):
-        
-        delta_P = new_partial_pressure - self.P_surface * self.x_gas[modified_species]
-        self.P_surface += delta_P
-        self.P_gas[modified_species] = new_partial_pressure
-
-        for species in self.x_gas.keys():
-            self.x_gas[species] = self.P_gas[species] / self.P_surface
-        self.calulate_mmw()
-
-        delta_n = (delta_P * self.area) / (SPECIES_MMW[modified_species] * self.gravity)
-        self.moles += delta_n
-        
-        self.calculate_n_gas()
+        self.ensemble.set_partial_pressure(new_partial_pressure, modified_species, self.rows)
 
     def radiative_convective_equilbrium(self):
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,225 @@
+import numpy as np
+
+from typing import Union
+from numpy.typing import ArrayLike
+
+from constants import EARTH_ATM
+from solvers import SolverResult
+from external import phreeqc
+from ocean import seawater_composition
+
+# Closed-form carbonate equilibrium for dilute, low-pressure water. Constants use the analytic
+# log K(T) expressions of phreeqc.dat, so at infinite dilution this engine agrees with PHREEQC.
+# Pressure only enters through the inputs, there is no pressure correction of the constants.
+
+# log K = A1 + A2 T + A3 / T + A4 log10(T) + A5 / T^2 + A6 T^2, T in K
+ANALYTIC_LOG_K: dict[str, tuple[float, ...]] = {
+    'HCO3-': (107.8871, 0.03252849, -5151.79, -38.92561, 563713.9, 0.0),      # CO3-2 + H+ = HCO3-
+    'CO2': (464.1965, 0.09344813, -26986.16, -165.75951, 2248628.9, 0.0),     # CO3-2 + 2H+ = CO2 + H2O
+    'OH-': (-283.971, -0.05069842, 13323.0, 102.24447, -1119669.0, 0.0),     # H2O = OH- + H+
+    'CO2(g)': (108.3865, 0.01985076, -6919.53, -40.45154, 669365.0, 0.0),     # CO2(g) = CO2
+    'H2O(g)': (-16.5066, -2.0013e-3, 2710.7, 3.7646, 0.0, 2.24e-6),           # H2O(g) = H2O
+}
+
+# charges used for the ionic strength of the major ions
+ION_CHARGE: dict[str, int] = {
+    'Cl': -1,
+    'Na': 1,
+    'Mg': 2,
+    'S(6)': -2,
+    'Ca': 2,
+    'K': 1,
+    'Si': 0,
+    'Al': 0,
+}
+
+
+def log_k(species: str, T: ArrayLike) -> np.ndarray:
+
+    A1, A2, A3, A4, A5, A6 = ANALYTIC_LOG_K[species]
+    T = np.asarray(T, dtype=np.float64)
+
+    return A1 + A2 * T + A3 / T + A4 * np.log10(T) + A5 / T ** 2 + A6 * T ** 2
+
+
+def _output(x: np.ndarray) -> Union[float, np.ndarray]:
+    return float(x) if np.ndim(x) == 0 else x
+
+
+class CarbonateConstants:
+
+    def __init__(self, T: ArrayLike, composition: dict[str, ArrayLike], activity: bool=True):
+
+        T = np.asarray(T, dtype=np.float64)
+
+        K_HCO3 = 10 ** log_k('HCO3-', T)
+        K_CO2 = 10 ** log_k('CO2', T)
+
+        self.K1 = K_HCO3 / K_CO2
+        self.K2 = 1 / K_HCO3
+        self.Kw = 10 ** log_k('OH-', T)
+        self.K0 = 10 ** log_k('CO2(g)', T)
+        self.K_H2O = 10 ** log_k('H2O(g)', T)
+
+        # the major ions set the ionic strength, the carbonate species are left out so forward and inverse problems agree
+        total_molality = sum((np.asarray(m, dtype=np.float64) for m in composition.values()), np.zeros_like(T))
+        ionic_strength = 0.5 * sum((np.asarray(m, dtype=np.float64) * ION_CHARGE.get(k, 0) ** 2 for k, m in composition.items()), np.zeros_like(T))
+
+        if activity:
+            # Davies equation for ions, log gamma = 0.1 I for dissolved CO2 and a_w = 1 - 0.017 sum(m) as in PHREEQC
+            A = 0.4883 + 8.074e-4 * (T - 273.15)
+            sqrt_I = np.sqrt(ionic_strength)
+            log_gamma_1 = -A * (sqrt_I / (1 + sqrt_I) - 0.3 * ionic_strength)
+            self.gamma_0 = 10 ** (0.1 * ionic_strength)
+            self.gamma_1 = 10 ** log_gamma_1
+            self.gamma_2 = 10 ** (4 * log_gamma_1)
+            self.a_w = np.clip(1 - 0.017 * total_molality, 1e-3, 1)
+        else:
+            self.gamma_0 = self.gamma_1 = self.gamma_2 = np.ones_like(T)
+            self.a_w = np.ones_like(T)
+
+        # conditional constants in molality with the H+ activity, a_H = 10^-pH
+        self.k1 = self.K1 * self.a_w * self.gamma_0 / self.gamma_1
+        self.k2 = self.K2 * self.gamma_1 / self.gamma_2
+        self.kw = self.Kw * self.a_w / self.gamma_1
+
+    def alkalinity(self, a_H: np.ndarray, carbon_molality: np.ndarray) -> np.ndarray:
+
+        denominator = a_H ** 2 + self.k1 * a_H + self.k1 * self.k2
+        carbonate_alkalinity = carbon_molality * (self.k1 * a_H + 2 * self.k1 * self.k2) / denominator
+
+        return carbonate_alkalinity + self.kw / a_H - a_H / self.gamma_1
+
+    def CO2_molality(self, a_H: np.ndarray, carbon_molality: np.ndarray) -> np.ndarray:
+        return carbon_molality * a_H ** 2 / (a_H ** 2 + self.k1 * a_H + self.k1 * self.k2)
+
+    def P_CO2(self, CO2_molality: np.ndarray) -> np.ndarray:
+        return self.gamma_0 * CO2_molality / self.K0 * EARTH_ATM
+
+    def P_H2O(self) -> np.ndarray:
+        return self.a_w / self.K_H2O * EARTH_ATM
+
+
+def _pH_from_alkalinity(constants: CarbonateConstants, alkalinity: np.ndarray, carbon_molality: np.ndarray, n_iterations: int=48) -> np.ndarray:
+
+    # alkalinity rises monotonically with pH, so bisection converges for every state at once
+    lower = np.zeros_like(alkalinity)
+    upper = np.full_like(alkalinity, 14.0)
+
+    for _ in range(n_iterations):
+        middle = 0.5 * (lower + upper)
+        too_basic = constants.alkalinity(10 ** -middle, carbon_molality) > alkalinity
+        upper = np.where(too_basic, middle, upper)
+        lower = np.where(too_basic, lower, middle)
+
+    return 0.5 * (lower + upper)
+
+
+def find_surface_state(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, activity: bool=True) -> tuple:
+
+    if carbon_molality is None:
+        raise ValueError("The carbonate engine needs the carbon molality")
+    if alkalinity is None and pH is None:
+        raise ValueError("Either alkalinity or pH has to be given")
+
+    arrays = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in [P, T, carbon_molality, alkalinity if alkalinity is not None else pH, *composition.values()]])
+    _, T_arr, C_arr, fixed_arr = arrays[:4]
+    composition_arr = dict(zip(composition.keys(), arrays[4:]))
+
+    constants = CarbonateConstants(T_arr, composition_arr, activity)
+
+    if alkalinity is not None:
+        alkalinity_arr = fixed_arr
+        pH_arr = _pH_from_alkalinity(constants, alkalinity_arr, C_arr)
+    else:
+        pH_arr = fixed_arr
+        alkalinity_arr = constants.alkalinity(10 ** -pH_arr, C_arr)
+
+    P_CO2 = constants.P_CO2(constants.CO2_molality(10 ** -pH_arr, C_arr))
+    P_H2O = constants.P_H2O()
+
+    return _output(P_CO2), _output(P_H2O), _output(pH_arr), _output(alkalinity_arr)
+
+
+def find_partial_pressures(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, activity: bool=True) -> tuple:
+
+    P_CO2, P_H2O, _, _ = find_surface_state(P, T, composition, alkalinity, carbon_molality, pH, activity)
+
+    return P_CO2, P_H2O
+
+
+def _reverse_state(P: ArrayLike, T: ArrayLike, P_CO2: ArrayLike, composition: dict[str, ArrayLike], carbon_molality: ArrayLike, activity: bool) -> tuple[np.ndarray, np.ndarray]:
+
+    arrays = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in [P, T, P_CO2, carbon_molality, *composition.values()]])
+    _, T_arr, P_CO2_arr, C_arr = arrays[:4]
+    composition_arr = dict(zip(composition.keys(), arrays[4:]))
+
+    constants = CarbonateConstants(T_arr, composition_arr, activity)
+
+    # P_CO2 fixes dissolved CO2, and DIC / CO2 = 1 + k1 / a_H + k1 k2 / a_H^2 is a quadratic in 1 / a_H
+    CO2_molality = P_CO2_arr / EARTH_ATM * constants.K0 / constants.gamma_0
+    excess = C_arr / CO2_molality - 1
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inverse_a_H = 2 * excess / (constants.k1 + np.sqrt(constants.k1 ** 2 + 4 * constants.k1 * constants.k2 * excess))
+        inverse_a_H = np.where(excess > 0, inverse_a_H, np.nan)
+        pH = np.log10(inverse_a_H)
+
+    alkalinity = constants.alkalinity(10 ** -pH, C_arr)
+
+    return pH, alkalinity
+
+
+def reverse_partial_pressure(P: ArrayLike, T: ArrayLike, P_CO2: ArrayLike, composition: dict[str, ArrayLike], carbon_molality: ArrayLike, find_alkalinity: bool=False, activity: bool=True) -> Union[float, np.ndarray]:
+
+    pH, alkalinity = _reverse_state(P, T, P_CO2, composition, carbon_molality, activity)
+
+    return _output(alkalinity) if find_alkalinity else _output(pH)
+
+
+def reverse_partial_pressure_fused(P: float, T: float, P_CO2: float, composition: dict[str, float], carbon_molality: float, pH_guess: float=8.0, bracket: tuple[float, float]=(0, 14), pH_step: float=0.1, xtol: float=1e-6, activity: bool=True) -> tuple[float, float, SolverResult]:
+
+    # closed form, the guess and bracket are accepted for compatibility with the PHREEQC version
+    pH, alkalinity = _reverse_state(P, T, P_CO2, composition, carbon_molality, activity)
+
+    return _output(pH), _output(alkalinity), SolverResult(float(pH), 0, 0, bool(np.isfinite(pH)))
+
+
+def validate(n_samples: int=200, T_range: tuple[float, float]=(275, 320), alkalinity_range: tuple[float, float]=(1e-4, 1e-2), carbon_molality_range: tuple[float, float]=(1e-4, 1e-2), salinity_range: tuple[float, float]=(0, 0.1), P: float=EARTH_ATM, activity: bool=True, seed: int=0) -> dict[str, Union[float, np.ndarray]]:
+
+    rng = np.random.default_rng(seed)
+
+    T = rng.uniform(*T_range, n_samples)
+    alkalinity = 10 ** rng.uniform(*np.log10(alkalinity_range), n_samples)
+    carbon_molality = 10 ** rng.uniform(*np.log10(carbon_molality_range), n_samples)
+    salinity = rng.uniform(*salinity_range, n_samples)
+
+    composition = seawater_composition(salinity)
+
+    # every sample goes into a single PHREEQC deck
+    P_CO2_phreeqc, P_H2O_phreeqc = phreeqc.find_partial_pressures_batch(P, T, composition, alkalinity, carbon_molality)
+    P_CO2_fast, P_H2O_fast = find_partial_pressures(P, T, composition, alkalinity, carbon_molality, activity=activity)
+
+    log_error_CO2 = np.log10(P_CO2_fast / P_CO2_phreeqc)
+    log_error_H2O = np.log10(P_H2O_fast / P_H2O_phreeqc)
+
+    return {
+        'T': T,
+        'alkalinity': alkalinity,
+        'carbon_molality': carbon_molality,
+        'salinity': salinity,
+        'log_error_CO2': log_error_CO2,
+        'log_error_H2O': log_error_H2O,
+        'max_log_error_CO2': float(np.nanmax(np.abs(log_error_CO2))),
+        'rms_log_error_CO2': float(np.sqrt(np.nanmean(log_error_CO2 ** 2))),
+        'max_log_error_H2O': float(np.nanmax(np.abs(log_error_H2O))),
+        'rms_log_error_H2O': float(np.sqrt(np.nanmean(log_error_H2O ** 2)))
+    }
+
+
+if __name__ == '__main__':
+
+    report = validate()
+
+    for k in ['max_log_error_CO2', 'rms_log_error_CO2', 'max_log_error_H2O', 'rms_log_error_H2O']:
+        print(f'{k}: {report[k]:.3e}')
@@ -0,0 +1,137 @@
+import ctypes
+import os
+import numpy as np
+
+from typing import Union
+
+IPhreeqc_library_path = os.environ.get('KAMINO_IPHREEQC_LIBRARY', 'external/phreeqc/lib/libiphreeqc.so')
+
+# VAR_TYPE values from IPhreeqc's Var.h
+TT_EMPTY = 0
+TT_ERROR = 1
+TT_LONG = 2
+TT_DOUBLE = 3
+TT_STRING = 4
+
+_library: Union[ctypes.CDLL, None] = None
+_instances: dict[str, 'IPhreeqc'] = {}
+
+
+def load_library(path: Union[str, None]=None) -> ctypes.CDLL:
+
+    global _library
+
+    if _library is not None:
+        return _library
+
+    library = ctypes.CDLL(os.path.abspath(path or IPhreeqc_library_path))
+
+    library.CreateIPhreeqc.restype = ctypes.c_int
+    library.DestroyIPhreeqc.argtypes = [ctypes.c_int]
+    library.LoadDatabase.argtypes = [ctypes.c_int, ctypes.c_char_p]
+    library.LoadDatabase.restype = ctypes.c_int
+    library.RunString.argtypes = [ctypes.c_int, ctypes.c_char_p]
+    library.RunString.restype = ctypes.c_int
+    library.GetErrorString.argtypes = [ctypes.c_int]
+    library.GetErrorString.restype = ctypes.c_char_p
+    library.GetSelectedOutputRowCount.argtypes = [ctypes.c_int]
+    library.GetSelectedOutputRowCount.restype = ctypes.c_int
+    library.GetSelectedOutputColumnCount.argtypes = [ctypes.c_int]
+    library.GetSelectedOutputColumnCount.restype = ctypes.c_int
+    library.GetSelectedOutputValue2.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_double), ctypes.c_char_p, ctypes.c_uint]
+    library.GetSelectedOutputValue2.restype = ctypes.c_int
+
+    for switch in ['SetOutputFileOn', 'SetSelectedOutputFileOn', 'SetErrorFileOn', 'SetLogFileOn', 'SetDumpFileOn']:
+        getattr(library, switch).argtypes = [ctypes.c_int, ctypes.c_int]
+
+    _library = library
+
+    return library
+
+
+class IPhreeqc:
+
+    def __init__(self, database: str):
+
+        self.library = load_library()
+        self.id = self.library.CreateIPhreeqc()
+
+        if self.id < 0:
+            raise RuntimeError("Could not create an IPhreeqc instance")
+
+        # results stay in memory, nothing is written next to the caller
+        for switch in ['SetOutputFileOn', 'SetSelectedOutputFileOn', 'SetErrorFileOn', 'SetLogFileOn', 'SetDumpFileOn']:
+            getattr(self.library, switch)(self.id, 0)
+
+        self.database = database
+
+        if self.library.LoadDatabase(self.id, database.encode()) != 0:
+            raise RuntimeError(f"IPhreeqc could not load {database}: {self.error_string()}")
+
+        self._value_type = ctypes.c_int()
+        self._double_value = ctypes.c_double()
+        self._string_value = ctypes.create_string_buffer(256)
+
+    def error_string(self) -> str:
+        return self.library.GetErrorString(self.id).decode(errors='replace')
+
+    def run_string(self, input_string: str) -> dict[str, np.ndarray]:
+
+        n_errors = self.library.RunString(self.id, input_string.encode())
+        selected = self.selected_output()
+
+        # like the executable, a failed point leaves the rows that were already written
+        if n_errors != 0 and not any(len(v) for v in selected.values()):
+            raise RuntimeError(f"IPhreeqc run failed: {self.error_string()}")
+
+        return selected
+
+    def _value(self, row: int, column: int) -> Union[float, str]:
+
+        self.library.GetSelectedOutputValue2(self.id, row, column, ctypes.byref(self._value_type), ctypes.byref(self._double_value), self._string_value, len(self._string_value))
+
+        value_type = self._value_type.value
+
+        if value_type == TT_DOUBLE or value_type == TT_LONG:
+            return self._double_value.value
+        if value_type == TT_STRING:
+            return self._string_value.value.decode()
+        return np.nan
+
+    def selected_output(self) -> dict[str, np.ndarray]:
+
+        n_rows = self.library.GetSelectedOutputRowCount(self.id)
+        n_columns = self.library.GetSelectedOutputColumnCount(self.id)
+
+        # row 0 holds the headings, the remaining rows are one per calculation
+        selected: dict[str, np.ndarray] = {}
+
+        for column in range(n_columns):
+            heading = str(self._value(0, column))
+            values = [self._value(row, column) for row in range(1, n_rows)]
+
+            if all(isinstance(v, float) for v in values):
+                selected[heading] = np.array(values, dtype=np.float64)
+            else:
+                selected[heading] = np.array(values, dtype=object)
+
+        return selected
+
+    def __del__(self):
+        if getattr(self, 'library', None) is not None and getattr(self, 'id', -1) >= 0:
+            self.library.DestroyIPhreeqc(self.id)
+
+
+def get_instance(database: str) -> IPhreeqc:
+
+    # one database-loaded instance per database and process, so pool workers each keep their own
+    key = f'{os.getpid()}:{database}'
+
+    if key not in _instances:
+        _instances[key] = IPhreeqc(database)
+
+    return _instances[key]
+
+
+def run_string(input_string: str, database: str) -> dict[str, np.ndarray]:
+    return get_instance(database).run_string(input_string)
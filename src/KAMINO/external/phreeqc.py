@@ -1,36 +1,197 @@
+import functools
+import inspect
 import subprocess
 import os
+import shutil
+import tempfile
+import warnings
 import pandas as pd
 import numpy as np
 from scipy.optimize import root_scalar # type: ignore
 
-from typing import Union
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Sequence, Union
+from numpy.typing import ArrayLike
 
-from utils import modify_file_by_lines, insert_lines_into_file
+from utils import read_template, modify_lines, insert_lines
+from profiling import timer, count
 from constants import EARTH_ATM, ABSOLUTE_ZERO
+from solvers import SolverResult, safeguarded_secant
+from external import iphreeqc
+from external.phreeqc_cache import PhreeqcCache
 
 PHREEQC_path = 'external/phreeqc/bin'
 
-output_file_path = f'{PHREEQC_path}/output.txt'
+PHREEQC_database_path = 'external/phreeqc-3.8.6-17100/database'
 
-def find_partial_pressures(P: float, T: float, composition: dict[str, float], alkalinity: Union[float, None]=None, carbon_molality: Union[float, None] = None, pH: Union[float, None]=None) -> tuple[float, float]:
+# 'analytic' solves the surface carbonate system in closed form (external/carbonate.py) without
+# PHREEQC; decks with minerals and the batched decks still run on the executable
+PHREEQC_backends = ('subprocess', 'iphreeqc', 'analytic')
+PHREEQC_backend = os.environ.get('KAMINO_PHREEQC_BACKEND', 'subprocess')
 
-    input_template_file_path = 'input/partial_pressure_input.txt'
-    input_file_path_new = f'{PHREEQC_path}/input'
-    wd: str = os.getcwd()
+PHREEQC_scratch_path: Union[str, None] = None # parent of the per-job directories, None uses the system temporary directory
 
-    input_modifications: dict[int, str] = {
-        1 : f'DATABASE {wd}/external/phreeqc-3.8.6-17100/database/phreeqc.dat',
-        4 : f'    temp        {T + ABSOLUTE_ZERO:.4f}        # Temperature in degrees Celsius',
-        5 : f'    pressure    {P / EARTH_ATM:.4f}         # Pressure in atmospheres',
-    }
+@contextmanager
+def phreeqc_job() -> Iterator[str]:
+
+    # every run gets its own directory, so concurrent jobs never share an input or output.txt
+    job_path = tempfile.mkdtemp(prefix='phreeqc_', dir=PHREEQC_scratch_path)
+
+    try:
+        yield job_path
+    finally:
+        shutil.rmtree(job_path, ignore_errors=True)
+
+def set_backend(backend: str) -> None:
+
+    global PHREEQC_backend
+
+    if backend not in PHREEQC_backends:
+        raise ValueError(f"Unknown PHREEQC backend '{backend}', expected one of {PHREEQC_backends}")
+
+    PHREEQC_backend = backend
+
+def _split_database(input_string: str) -> tuple[str, str]:
+
+    first_line, _, rest = input_string.partition('\n')
+
+    if not first_line.startswith('DATABASE'):
+        raise ValueError("PHREEQC input has to open with a DATABASE line")
+
+    return first_line.split(maxsplit=1)[1].strip(), rest
+
+def run_phreeqc_subprocess(input_string: str) -> dict[str, np.ndarray]:
+
+    with phreeqc_job() as job_path:
+
+        with timer('phreeqc.write_input'):
+            with open(os.path.join(job_path, 'input'), 'w') as file:
+                file.write(input_string)
+
+        executable = os.path.join(os.path.abspath(PHREEQC_path), 'phreeqc')
+
+        with timer('phreeqc.subprocess'):
+            subprocess.run([executable, 'input'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=job_path)
+        count('phreeqc.runs')
+
+        with timer('phreeqc.read_output'):
+            solution_df: pd.DataFrame = pd.read_table(os.path.join(job_path, 'output.txt'), sep='\s+') # type: ignore
+        count('phreeqc.output_rows', len(solution_df))
+
+    return {str(k): solution_df[k].to_numpy() for k in solution_df.columns} # type: ignore
+
+def run_phreeqc_iphreeqc(input_string: str) -> dict[str, np.ndarray]:
+
+    # IPhreeqc loads the database once per worker instead of reading the DATABASE keyword every run
+    database, input_string = _split_database(input_string)
+
+    with timer('phreeqc.iphreeqc'):
+        selected_output = iphreeqc.run_string(input_string, database)
+    count('phreeqc.runs')
+
+    return selected_output
+
+def run_phreeqc(input_string: str) -> dict[str, np.ndarray]:
+
+    if PHREEQC_backend == 'iphreeqc':
+        try:
+            return run_phreeqc_iphreeqc(input_string)
+        except OSError as e:
+            warnings.warn(f"IPhreeqc library could not be loaded ({e}), falling back to the PHREEQC executable")
+            set_backend('subprocess')
+
+    return run_phreeqc_subprocess(input_string)
+
+PHREEQC_cache: Union[PhreeqcCache, None] = None
+
+def enable_cache(maxsize: int=100_000, path: Union[str, None]=None, significant_digits: int=10) -> PhreeqcCache:
+
+    global PHREEQC_cache
+
+    PHREEQC_cache = PhreeqcCache(maxsize, path, significant_digits)
+
+    return PHREEQC_cache
+
+def disable_cache() -> None:
+
+    global PHREEQC_cache
+
+    PHREEQC_cache = None
+
+def cache_stats() -> dict[str, Union[int, float]]:
+    return PHREEQC_cache.stats() if PHREEQC_cache is not None else {}
+
+def _database_file(database: str) -> str:
+    return os.path.join(os.getcwd(), PHREEQC_database_path, database)
+
+def invalidate_cache(database: Union[str, None]=None) -> None:
+
+    if PHREEQC_cache is not None:
+        PHREEQC_cache.invalidate(None if database is None else _database_file(database))
+
+def _database_fingerprint(database: str) -> str:
+
+    # editing the database file changes the fingerprint, so stale results are never looked up
+    path = _database_file(database)
+
+    try:
+        stat = os.stat(path)
+        return f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+    except OSError:
+        return f'{path}:missing'
+
+def _cached(database: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
 
-    modify_file_by_lines(input_template_file_path, input_file_path_new, input_modifications)
+    def decorator(function: Callable[..., Any]) -> Callable[..., Any]:
+
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+
+            if PHREEQC_cache is None:
+                return function(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            fingerprint = _database_fingerprint(database)
+            key = PHREEQC_cache.key(function.__name__, fingerprint, dict(bound.arguments))
+
+            value = PHREEQC_cache.get(key)
+
+            if value is None:
+                value = function(*args, **kwargs)
+                PHREEQC_cache.put(key, fingerprint, value)
+                return value
+
+            return tuple(value) if isinstance(value, list) else value
+
+        return wrapper
+
+    return decorator
+
+def _analytic(function: Callable[..., Any]) -> Callable[..., Any]:
+
+    # routes a call to the function of the same name in external/carbonate.py, ahead of the cache
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+
+        if PHREEQC_backend == 'analytic':
+            from external import carbonate
+            return getattr(carbonate, function.__name__)(*args, **kwargs)
+
+        return function(*args, **kwargs)
+
+    return wrapper
+
+def _solution_lines(composition: dict[str, float], alkalinity: Union[float, None]=None, carbon_molality: Union[float, None] = None, pH: Union[float, None]=None) -> list[str]:
 
     input_newlines: list[str] = []
 
     if pH is not None:
-        input_newlines.append(f'    pH    {pH:.2f}')
+        input_newlines.append(f'    pH    {pH:.6f}')
     if carbon_molality is not None:
         input_newlines.append(f'    C    {carbon_molality}')
     if alkalinity is not None:
@@ -39,20 +200,49 @@ def find_partial_pressures(P: float, T: float, composition: dict[str, float], al
     for k in composition.keys():
         input_newlines.append(f'    {k}    {composition[k]:.8f}')
 
-    insert_lines_into_file(input_file_path_new, input_newlines, 6)
+    return input_newlines
+
+@_analytic
+@_cached('phreeqc.dat')
+def find_surface_state(P: float, T: float, composition: dict[str, float], alkalinity: Union[float, None]=None, carbon_molality: Union[float, None] = None, pH: Union[float, None]=None) -> tuple[float, float, float, float]:
+
+    input_template_file_path = 'input/partial_pressure_input.txt'
+    wd: str = os.getcwd()
+
+    input_modifications: dict[int, str] = {
+        1 : f'DATABASE {wd}/{PHREEQC_database_path}/phreeqc.dat',
+        4 : f'    temp        {T + ABSOLUTE_ZERO:.4f}        # Temperature in degrees Celsius',
+        5 : f'    pressure    {P / EARTH_ATM:.4f}         # Pressure in atmospheres',
+    }
+
+    input_lines = modify_lines(list(read_template(input_template_file_path)), input_modifications)
 
-    subprocess.run(['./phreeqc', 'input'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=PHREEQC_path)
+    input_newlines = _solution_lines(composition, alkalinity, carbon_molality, pH)
 
-    solution_df: pd.DataFrame = pd.read_table(output_file_path, sep='\s+') # type: ignore
+    input_lines = insert_lines(input_lines, input_newlines, 6)
 
-    si_CO2 = float(solution_df.at[0, 'si_CO2(g)']) # type: ignore
-    si_H2O = float(solution_df.at[0, 'si_H2O(g)']) # type: ignore
+    selected_output = run_phreeqc(''.join(input_lines))
+
+    si_CO2 = float(selected_output['si_CO2(g)'][0])
+    si_H2O = float(selected_output['si_H2O(g)'][0])
 
     P_CO2 = (10 ** si_CO2) * EARTH_ATM
     P_H2O = (10 ** si_H2O) * EARTH_ATM
 
+    # the same run reports the pH and alkalinity that go with whichever of them was fixed
+    new_pH = float(selected_output['pH'][0])
+    new_alkalinity = float(selected_output['Alkalinity'][0])
+
+    return (P_CO2, P_H2O, new_pH, new_alkalinity)
+
+def find_partial_pressures(P: float, T: float, composition: dict[str, float], alkalinity: Union[float, None]=None, carbon_molality: Union[float, None] = None, pH: Union[float, None]=None) -> tuple[float, float]:
+
+    P_CO2, P_H2O, _, _ = find_surface_state(P, T, composition, alkalinity, carbon_molality, pH)
+
     return (P_CO2, P_H2O)
 
+@_analytic
+@_cached('phreeqc.dat')
 def reverse_partial_pressure(P: float, T: float, P_CO2: float, composition: dict[str, float], carbon_molality: float, find_alkalinity: bool=False) -> float:
     
     def P_CO2_function_alk(alkalinity: float): 
@@ -66,15 +256,56 @@ def reverse_partial_pressure(P: float, T: float, P_CO2: float, composition: dict
     else:
         result = root_scalar(P_CO2_function_pH, bracket=(0, 14), method='brentq')  # type: ignore
 
+    count('reverse_partial_pressure.brentq_iterations', result.iterations)  # type: ignore
+    count('reverse_partial_pressure.brentq_function_calls', result.function_calls)  # type: ignore
+
     if result.converged:  # type: ignore
         return result.root  # type: ignore
     else:
         raise ValueError("Root finding did not converge")
+
+@_analytic
+def reverse_partial_pressure_fused(P: float, T: float, P_CO2: float, composition: dict[str, float], carbon_molality: float, pH_guess: float=8.0, bracket: tuple[float, float]=(0, 14), pH_step: float=0.1, xtol: float=1e-6) -> tuple[float, float, SolverResult]:
+
+    # a PHREEQC run at fixed pH and C also reports the alkalinity, so one root solve gives both
+    states: dict[float, tuple[float, float, float, float]] = {}
+    function_calls = 0
+
+    def log_P_CO2_residual(pH: float) -> float:
+        nonlocal function_calls
+        function_calls += 1
+        states[pH] = find_surface_state(P, T, composition, pH=pH, carbon_molality=carbon_molality)
+        return float(np.log10(states[pH][0] / P_CO2))
+
+    # log P_CO2 is close to linear in pH, so secant steps from a warm start converge in a few runs
+    result = safeguarded_secant(log_P_CO2_residual, pH_guess, pH_guess + pH_step, bracket, xtol)
+
+    if not result.converged:
+
+        # a bracket that misses the root is widened to the whole pH scale before giving up
+        lower, upper = bracket
+        if log_P_CO2_residual(lower) * log_P_CO2_residual(upper) > 0:
+            lower, upper = min(lower, 0), max(upper, 14)
+            if (lower, upper) == tuple(bracket) or log_P_CO2_residual(lower) * log_P_CO2_residual(upper) > 0:
+                raise ValueError(f"No pH in ({lower}, {upper}) gives P_CO2 = {P_CO2:.4g} Pa (pH bracket {tuple(bracket)})")
+
+        fallback = root_scalar(log_P_CO2_residual, bracket=(lower, upper), method='brentq', xtol=xtol)  # type: ignore
+        if not fallback.converged:  # type: ignore
+            raise ValueError(f"Root finding did not converge for pH in ({lower}, {upper})")
+        log_P_CO2_residual(fallback.root)  # type: ignore
+        result = SolverResult(fallback.root, result.iterations + fallback.iterations, function_calls, True)  # type: ignore
+
+    count('reverse_partial_pressure_fused.iterations', result.iterations)
+    count('reverse_partial_pressure_fused.function_calls', result.function_calls)
+
+    _, _, pH, alkalinity = states[result.root]
+
+    return pH, alkalinity, result
     
+@_cached('phreeqc.dat')
 def seafloor_equilbrium(P_seafloor:float, T_seafloor:float, composition: dict[str, float], minerals: list[str], alkalinity: Union[float, None]=None, carbon_molality: Union[float, None] = None, pH: Union[float, None]=None) -> tuple[dict[str, float], float, float]:
     
     input_template_file_path = 'input/seafloor_weathering_input.txt'
-    input_file_path_new = f'{PHREEQC_path}/input'
     wd: str = os.getcwd()
 
     mineral_list = ''
@@ -82,107 +313,435 @@ def seafloor_equilbrium(P_seafloor:float, T_seafloor:float, composition: dict[st
         mineral_list += mineral + ' '
 
     input_modifications: dict[int, str] = {
-        1 : f'DATABASE {wd}/external/phreeqc-3.8.6-17100/database/phreeqc.dat',
+        1 : f'DATABASE {wd}/{PHREEQC_database_path}/phreeqc.dat',
         9: f'    {P_seafloor / EARTH_ATM:.4f}',
         11: f'    {T_seafloor + ABSOLUTE_ZERO:.4f}',
         16: f'    -equilibrium_phases {mineral_list}',
         17: f'    -saturation_indices {mineral_list}'
     }
 
-    modify_file_by_lines(input_template_file_path, input_file_path_new, input_modifications)
+    input_lines = modify_lines(list(read_template(input_template_file_path)), input_modifications)
 
     input_newlines: list[str] = []
     for mineral in minerals:
         input_newlines.append(f'    {mineral}   0.0 10.0')
-    insert_lines_into_file(input_file_path_new, input_newlines, 6)
-
-    input_newlines: list[str] = []
-
-    if pH is not None:
-        input_newlines.append(f'    pH    {pH:.2f}')
-    if carbon_molality is not None:
-        input_newlines.append(f'    C    {carbon_molality}')
-    if alkalinity is not None:
-        input_newlines.append(f'    Alkalinity    {alkalinity:.8f} as HCO3')
-
-    for k in composition.keys():
-        input_newlines.append(f'    {k}    {composition[k]:.8f}')
-
-    insert_lines_into_file(input_file_path_new, input_newlines, 4)
+    input_lines = insert_lines(input_lines, input_newlines, 6)
 
-    subprocess.run(['./phreeqc', 'input'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=PHREEQC_path)
+    input_newlines = _solution_lines(composition, alkalinity, carbon_molality, pH)
 
-    solution_df: pd.DataFrame = pd.read_table(output_file_path, sep='\s+') # type: ignore
+    input_lines = insert_lines(input_lines, input_newlines, 4)
 
-    # print(solution_df.keys())
+    selected_output = run_phreeqc(''.join(input_lines))
 
     new_composition: dict[str, float]= {}
 
     for k in composition:
-        new_composition[k] = float(np.array(solution_df[k])[1]) # type: ignore
+        new_composition[k] = float(selected_output[k][1])
 
-    new_alkalinity = float(np.array(solution_df['Alkalinity'])[1]) # type: ignore
-    new_carbon_molality = float(np.array(solution_df['C'])[1]) # type: ignore
+    new_alkalinity = float(selected_output['Alkalinity'][1])
+    new_carbon_molality = float(selected_output['C'][1])
 
     return new_composition, new_alkalinity, new_carbon_molality
 
+@_cached('Kinec_v3.dat')
 def seafloor_equilbrium_v2(P_seafloor:float, T_seafloor:float, composition: dict[str, float], minerals: list[str], alkalinity: Union[float, None]=None, carbon_molality: Union[float, None] = None, pH: Union[float, None]=None) -> tuple[dict[str, float], float, float]:
     
     input_template_file_path = 'input/seafloor_weathering_input_v2.txt'
-    input_file_path_new = f'{PHREEQC_path}/input'
     wd: str = os.getcwd()
 
     mineral_list = ''
     for mineral in minerals:
         mineral_list += mineral + ' '
 
-    #external/phreeqc-3.8.6-17100/database/Kinec_v3.dat
-
     input_modifications: dict[int, str] = {
-        1 : f'DATABASE {wd}/external/phreeqc-3.8.6-17100/database/Kinec_v3.dat',
+        1 : f'DATABASE {wd}/{PHREEQC_database_path}/Kinec_v3.dat',
         6: f'    pressure {P_seafloor / EARTH_ATM:.4f}',
         5: f'    temp {T_seafloor + ABSOLUTE_ZERO:.4f}',
         16: f'    -equilibrium_phases {mineral_list}',
         17: f'    -saturation_indices {mineral_list}'
     }
 
-    modify_file_by_lines(input_template_file_path, input_file_path_new, input_modifications)
+    input_lines = modify_lines(list(read_template(input_template_file_path)), input_modifications)
 
     input_newlines: list[str] = []
     for mineral in minerals:
         input_newlines.append(f'    {mineral}   0.0 10.0')
-    insert_lines_into_file(input_file_path_new, input_newlines, 8)
+    input_lines = insert_lines(input_lines, input_newlines, 8)
 
-    input_newlines: list[str] = []
+    input_newlines = _solution_lines(composition, alkalinity, carbon_molality, pH)
 
-    if pH is not None:
-        input_newlines.append(f'    pH    {pH:.2f}')
-    if carbon_molality is not None:
-        input_newlines.append(f'    C    {carbon_molality}')
-    if alkalinity is not None:
-        input_newlines.append(f'    Alkalinity    {alkalinity:.8f} as HCO3')
+    input_lines = insert_lines(input_lines, input_newlines, 6)
 
-    for k in composition.keys():
-        input_newlines.append(f'    {k}    {composition[k]:.8f}')
+    selected_output = run_phreeqc(''.join(input_lines))
 
-    insert_lines_into_file(input_file_path_new, input_newlines, 6)
+    new_composition: dict[str, float]= {}
+
+    for k in composition:
+        new_composition[k] = float(selected_output[k][1])
 
-    subprocess.run(['./phreeqc', 'input'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=PHREEQC_path)
+    new_alkalinity = float(selected_output['Alkalinity'][1])
+    new_carbon_molality = float(selected_output['C'][1])
 
-    solution_df: pd.DataFrame = pd.read_table(output_file_path, sep='\s+') # type: ignore
+    return new_composition, new_alkalinity, new_carbon_molality
 
-    # print(solution_df.keys())
+def _broadcast_inputs(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None]=None, pH: Union[ArrayLike, None]=None) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray], Union[np.ndarray, None], Union[np.ndarray, None], Union[np.ndarray, None]]:
 
-    new_composition: dict[str, float]= {}
+    optional = [x for x in (alkalinity, carbon_molality, pH) if x is not None]
+    arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=np.float64)).ravel() for x in [P, T, *composition.values(), *optional]])
+
+    P_arr, T_arr = arrays[0], arrays[1]
+    composition_arr = dict(zip(composition.keys(), arrays[2:2 + len(composition)]))
+
+    optional_arr = iter(arrays[2 + len(composition):])
+    alkalinity_arr = next(optional_arr) if alkalinity is not None else None
+    carbon_molality_arr = next(optional_arr) if carbon_molality is not None else None
+    pH_arr = next(optional_arr) if pH is not None else None
+
+    return P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr
+
+def _batch_solution_lines(i: int, composition: dict[str, np.ndarray], alkalinity: Union[np.ndarray, None], carbon_molality: Union[np.ndarray, None], pH: Union[np.ndarray, None]) -> list[str]:
+
+    return _solution_lines(
+        {k: float(v[i]) for k, v in composition.items()},
+        None if alkalinity is None else float(alkalinity[i]),
+        None if carbon_molality is None else float(carbon_molality[i]),
+        None if pH is None else float(pH[i])
+    )
+
+def _select_rows(selected_output: dict[str, np.ndarray], state: str, index_column: str, n: int, offset: int, stride: int=1) -> dict[str, np.ndarray]:
+
+    # rows missing from a failed solution come back as NaN rather than shifting the remaining results;
+    # with a stride, point i is reported at offset + i * stride
+    mask = selected_output['state'] == state
+    index, remainder = np.divmod(selected_output[index_column][mask].astype(np.int64) - offset, stride)
+    valid = (remainder == 0) & (index >= 0) & (index < n)
+
+    rows: dict[str, np.ndarray] = {}
+
+    for k, v in selected_output.items():
+        if v.dtype.kind not in 'fiu':
+            continue
+        column = np.full(n, np.nan)
+        column[index[valid]] = v[mask][valid]
+        rows[k] = column
+
+    return rows
+
+def find_surface_state_batch(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+
+    P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr = _broadcast_inputs(P, T, composition, alkalinity, carbon_molality, pH)
+    n = len(P_arr)
+    wd: str = os.getcwd()
+
+    input_lines: list[str] = [
+        f'DATABASE {wd}/{PHREEQC_database_path}/phreeqc.dat',
+        '',
+        'SELECTED_OUTPUT',
+        '    -file output.txt',
+        '    -saturation_indices CO2(g)',
+        '    -saturation_indices H2O(g)',
+        '    -totals Alkalinity',
+        '    -pH',
+        ''
+    ]
+
+    for i in range(n):
+        input_lines += [
+            f'SOLUTION {i + 1} Ocean',
+            f'    temp        {T_arr[i] + ABSOLUTE_ZERO:.4f}',
+            f'    pressure    {P_arr[i] / EARTH_ATM:.4f}',
+            '    units       mol/kgw'
+        ]
+        input_lines += _batch_solution_lines(i, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr)
+        input_lines.append('')
+
+    input_lines.append('END')
+
+    selected_output = _select_rows(run_phreeqc('\n'.join(input_lines) + '\n'), 'i_soln', 'soln', n, 1)
+
+    P_CO2 = (10 ** selected_output['si_CO2(g)']) * EARTH_ATM
+    P_H2O = (10 ** selected_output['si_H2O(g)']) * EARTH_ATM
+
+    return P_CO2, P_H2O, selected_output['pH'], selected_output['Alkalinity']
+
+def speciate_batch(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, minerals: Sequence[str]=()) -> dict[str, np.ndarray]:
+
+    # speciation of every point, e.g. every level of an ocean column, as one initial solution each;
+    # returns pH, alkalinity, DIC, P_CO2 and the saturation index of each mineral as si_<mineral>
+    P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr = _broadcast_inputs(P, T, composition, alkalinity, carbon_molality, pH)
+    n = len(P_arr)
+    wd: str = os.getcwd()
+
+    input_lines: list[str] = [
+        f'DATABASE {wd}/{PHREEQC_database_path}/phreeqc.dat',
+        '',
+        'SELECTED_OUTPUT',
+        '    -file output.txt',
+        f'    -saturation_indices {" ".join(["CO2(g)", *minerals])}',
+        '    -totals C Alkalinity',
+        '    -pH',
+        ''
+    ]
+
+    for i in range(n):
+        input_lines += [
+            f'SOLUTION {i + 1} Ocean',
+            f'    temp        {T_arr[i] + ABSOLUTE_ZERO:.4f}',
+            f'    pressure    {P_arr[i] / EARTH_ATM:.4f}',
+            '    units       mol/kgw'
+        ]
+        input_lines += _batch_solution_lines(i, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr)
+        input_lines.append('')
+
+    input_lines.append('END')
+
+    selected_output = _select_rows(run_phreeqc('\n'.join(input_lines) + '\n'), 'i_soln', 'soln', n, 1)
+
+    result = {
+        'pH': selected_output['pH'],
+        'alkalinity': selected_output['Alkalinity'],
+        'DIC': selected_output['C'],
+        'P_CO2': (10 ** selected_output['si_CO2(g)']) * EARTH_ATM
+    }
+
+    for mineral in minerals:
+        result[f'si_{mineral}'] = selected_output[f'si_{mineral}']
+
+    return result
+
+def find_partial_pressures_batch(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple[np.ndarray, np.ndarray]:
+
+    P_CO2, P_H2O, _, _ = find_surface_state_batch(P, T, composition, alkalinity, carbon_molality, pH)
+
+    return P_CO2, P_H2O
+
+def _read_seafloor_batch(selected_output: dict[str, np.ndarray], composition: dict[str, np.ndarray], n: int) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+
+    # the deck opens with one simulation per point, so point i is reported by simulation i + 1
+    selected_output = _select_rows(selected_output, 'react', 'sim', n, 1)
+
+    new_composition: dict[str, np.ndarray] = {}
 
     for k in composition:
-        new_composition[k] = float(np.array(solution_df[k])[1]) # type: ignore
+        new_composition[k] = selected_output[k]
+
+    new_alkalinity = selected_output['Alkalinity']
+    new_carbon_molality = selected_output['C']
+
+    return new_composition, new_alkalinity, new_carbon_molality
+
+def _seafloor_selected_output_lines(minerals: Sequence[str], totals: str, gases: Sequence[str]=()) -> list[str]:
+
+    mineral_list = ' '.join(minerals)
+    saturation_list = ' '.join([*minerals, *gases])
+
+    return [
+        'SELECTED_OUTPUT',
+        '    -file output.txt',
+        f'    -totals {totals}',
+        f'    -equilibrium_phases {mineral_list}',
+        f'    -saturation_indices {saturation_list}',
+        '    -pH',
+        ''
+    ]
+
+def seafloor_equilbrium_batch(P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+
+    P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr = _broadcast_inputs(P_seafloor, T_seafloor, composition, alkalinity, carbon_molality, pH)
+    n = len(P_arr)
+    wd: str = os.getcwd()
+
+    input_lines: list[str] = [f'DATABASE {wd}/{PHREEQC_database_path}/phreeqc.dat', '']
+    input_lines += _seafloor_selected_output_lines(minerals, 'Ca Mg Na K Cl S(6) C Alkalinity Al Si')
+
+    # each point is its own simulation, so every SOLUTION/EQUILIBRIUM_PHASES/REACTION block is
+    # used only by the batch reaction it is defined with
+    for i in range(n):
+        input_lines.append(f'SOLUTION {i + 1} Ocean')
+        input_lines.append('    units       mol/kgw')
+        input_lines += _batch_solution_lines(i, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr)
+        input_lines.append(f'EQUILIBRIUM_PHASES {i + 1} Seafloor')
+        input_lines += [f'    {mineral}   0.0 10.0' for mineral in minerals]
+        input_lines += [
+            f'REACTION_PRESSURE {i + 1}',
+            f'    {P_arr[i] / EARTH_ATM:.4f}',
+            f'REACTION_TEMPERATURE {i + 1}',
+            f'    {T_arr[i] + ABSOLUTE_ZERO:.4f}',
+            'END'
+        ]
+
+    return _read_seafloor_batch(run_phreeqc('\n'.join(input_lines) + '\n'), composition_arr, n)
+
+def seafloor_equilbrium_v2_batch(P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+
+    P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr = _broadcast_inputs(P_seafloor, T_seafloor, composition, alkalinity, carbon_molality, pH)
+    n = len(P_arr)
+    wd: str = os.getcwd()
+
+    input_lines: list[str] = [f'DATABASE {wd}/{PHREEQC_database_path}/Kinec_v3.dat', '']
+    input_lines += _seafloor_selected_output_lines(minerals, 'Ca Mg Na K Cl S(6) C Alkalinity Si Al')
+
+    for i in range(n):
+        input_lines += [
+            f'SOLUTION {i + 1} Ocean',
+            '    units       mol/kgw',
+            f'    temp {T_arr[i] + ABSOLUTE_ZERO:.4f}',
+            f'    pressure {P_arr[i] / EARTH_ATM:.4f}'
+        ]
+        input_lines += _batch_solution_lines(i, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr)
+        input_lines.append(f'EQUILIBRIUM_PHASES {i + 1} Seafloor')
+        input_lines += [f'    {mineral}   0.0 10.0' for mineral in minerals]
+        input_lines.append('END')
+
+    return _read_seafloor_batch(run_phreeqc('\n'.join(input_lines) + '\n'), composition_arr, n)
+
+def seafloor_feedback_batch(P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, P_surface: float=EARTH_ATM, T_surface: float=293, dT: float=1, dP: Union[float, None]=None) -> dict[str, np.ndarray]:
+
+    # surface P_CO2 of an ocean equilibrated with the minerals at the seafloor, and its response to a warmer
+    # (and optionally deeper) seafloor, as one deck: every point runs a chain of simulations that equilibrates,
+    # saves the solution, perturbs it with fresh minerals and takes each result to the surface
+    P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr = _broadcast_inputs(P_seafloor, T_seafloor, composition, alkalinity, carbon_molality, pH)
+    n = len(P_arr)
+    wd: str = os.getcwd()
+
+    perturbations = [('dT', 0.0, dT)] + ([] if dP is None else [('dP', dP, 0.0)])
+    n_steps = 2 + 2 * len(perturbations)
+
+    input_lines: list[str] = [f'DATABASE {wd}/{PHREEQC_database_path}/phreeqc.dat', '']
+    input_lines += _seafloor_selected_output_lines(minerals, 'Ca Mg Na K Cl S(6) C Alkalinity Al Si', ['CO2(g)', 'H2O(g)'])
+
+    def equilibrate(P: float, T: float) -> list[str]:
+        lines = [f'EQUILIBRIUM_PHASES {i + 1} Seafloor']
+        lines += [f'    {mineral}   0.0 10.0' for mineral in minerals]
+        lines += [
+            f'REACTION_PRESSURE {i + 1}',
+            f'    {P / EARTH_ATM:.4f}',
+            f'REACTION_TEMPERATURE {i + 1}',
+            f'    {T + ABSOLUTE_ZERO:.4f}'
+        ]
+        return lines
+
+    def to_surface(solution: int) -> list[str]:
+        return [
+            f'USE solution {solution}',
+            f'REACTION_PRESSURE {i + 1}',
+            f'    {P_surface / EARTH_ATM:.4f}',
+            f'REACTION_TEMPERATURE {i + 1}',
+            f'    {T_surface + ABSOLUTE_ZERO:.4f}',
+            'END'
+        ]
+
+    # solutions 1..n are the inputs, the seafloor state of point i is saved as n + i + 1 and
+    # the perturbed states as (k + 2) n + i + 1
+    for i in range(n):
+
+        seafloor = n + i + 1
+
+        input_lines.append(f'SOLUTION {i + 1} Ocean')
+        input_lines.append('    units       mol/kgw')
+        input_lines += _batch_solution_lines(i, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr)
+        input_lines += equilibrate(P_arr[i], T_arr[i])
+        input_lines += [f'SAVE solution {seafloor}', 'END']
+        input_lines += to_surface(seafloor)
+
+        for k, (_, P_step, T_step) in enumerate(perturbations):
+            perturbed = (k + 2) * n + i + 1
+            input_lines.append(f'USE solution {seafloor}')
+            input_lines += equilibrate(P_arr[i] + P_step, T_arr[i] + T_step)
+            input_lines += [f'SAVE solution {perturbed}', 'END']
+            input_lines += to_surface(perturbed)
+
+    selected_output = run_phreeqc('\n'.join(input_lines) + '\n')
+
+    # simulation 1 + i * n_steps + step reports step of point i
+    steps = [_select_rows(selected_output, 'react', 'sim', n, 1 + step, n_steps) for step in range(n_steps)]
+
+    P_CO2 = (10 ** steps[1]['si_CO2(g)']) * EARTH_ATM
+
+    result = {
+        'P_CO2': P_CO2,
+        'alkalinity': steps[0]['Alkalinity'],
+        'carbon_molality': steps[0]['C']
+    }
+
+    for k, (name, P_step, T_step) in enumerate(perturbations):
+        P_CO2_perturbed = (10 ** steps[3 + 2 * k]['si_CO2(g)']) * EARTH_ATM
+        result[f'P_CO2_{name}'] = P_CO2_perturbed
+        result[f'dP_CO2_{name}'] = (P_CO2_perturbed - P_CO2) / (T_step if name == 'dT' else P_step)
+
+    return result
+
+def _run_batch_job(job: tuple[Callable[..., tuple], np.ndarray, np.ndarray, dict[str, np.ndarray], Union[np.ndarray, None], Union[np.ndarray, None], Union[np.ndarray, None], dict]) -> tuple:
+
+    function, P, T, composition, alkalinity, carbon_molality, pH, kwargs = job
+
+    return function(P, T, composition, alkalinity=alkalinity, carbon_molality=carbon_molality, pH=pH, **kwargs)
+
+def _map_batches(function: Callable[..., tuple], P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None], carbon_molality: Union[ArrayLike, None], pH: Union[ArrayLike, None], kwargs: dict, max_workers: Union[int, None], batch_size: Union[int, None], executor: Union[Executor, None]) -> list[tuple]:
 
-    new_alkalinity = float(np.array(solution_df['Alkalinity'])[1]) # type: ignore
-    new_carbon_molality = float(np.array(solution_df['C'])[1]) # type: ignore
+    P_arr, T_arr, composition_arr, alkalinity_arr, carbon_molality_arr, pH_arr = _broadcast_inputs(P, T, composition, alkalinity, carbon_molality, pH)
+    n = len(P_arr)
+
+    if batch_size is None:
+        # a few batches per worker keeps every core busy when some points converge slower than others
+        n_workers = max_workers or os.cpu_count() or 1
+        batch_size = max(1, -(-n // (4 * n_workers)))
+
+    def part(x: Union[np.ndarray, None], s: slice) -> Union[np.ndarray, None]:
+        return None if x is None else x[s]
+
+    jobs = []
+    for start in range(0, n, batch_size):
+        s = slice(start, start + batch_size)
+        jobs.append((function, P_arr[s], T_arr[s], {k: v[s] for k, v in composition_arr.items()}, part(alkalinity_arr, s), part(carbon_molality_arr, s), part(pH_arr, s), kwargs))
+
+    # map keeps the batches in input order however the workers finish
+    if executor is not None:
+        return list(executor.map(_run_batch_job, jobs))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_run_batch_job, jobs))
+
+def _concatenate_seafloor_batches(results: list[tuple], composition: dict[str, ArrayLike]) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+
+    new_composition = {k: np.concatenate([r[0][k] for r in results]) for k in composition}
+    new_alkalinity = np.concatenate([r[1] for r in results])
+    new_carbon_molality = np.concatenate([r[2] for r in results])
 
     return new_composition, new_alkalinity, new_carbon_molality
 
+def find_surface_state_parallel(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, max_workers: Union[int, None]=None, batch_size: Union[int, None]=None, executor: Union[Executor, None]=None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+
+    results = _map_batches(find_surface_state_batch, P, T, composition, alkalinity, carbon_molality, pH, {}, max_workers, batch_size, executor)
+
+    P_CO2, P_H2O, new_pH, new_alkalinity = (np.concatenate([r[i] for r in results]) for i in range(4))
+
+    return P_CO2, P_H2O, new_pH, new_alkalinity
+
+def find_partial_pressures_parallel(P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, max_workers: Union[int, None]=None, batch_size: Union[int, None]=None, executor: Union[Executor, None]=None) -> tuple[np.ndarray, np.ndarray]:
+
+    P_CO2, P_H2O, _, _ = find_surface_state_parallel(P, T, composition, alkalinity, carbon_molality, pH, max_workers, batch_size, executor)
+
+    return P_CO2, P_H2O
+
+def seafloor_equilbrium_parallel(P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, max_workers: Union[int, None]=None, batch_size: Union[int, None]=None, executor: Union[Executor, None]=None) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+
+    results = _map_batches(seafloor_equilbrium_batch, P_seafloor, T_seafloor, composition, alkalinity, carbon_molality, pH, {'minerals': minerals}, max_workers, batch_size, executor)
+
+    return _concatenate_seafloor_batches(results, composition)
+
+def seafloor_equilbrium_v2_parallel(P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, max_workers: Union[int, None]=None, batch_size: Union[int, None]=None, executor: Union[Executor, None]=None) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+
+    results = _map_batches(seafloor_equilbrium_v2_batch, P_seafloor, T_seafloor, composition, alkalinity, carbon_molality, pH, {'minerals': minerals}, max_workers, batch_size, executor)
+
+    return _concatenate_seafloor_batches(results, composition)
+
+def seafloor_feedback_parallel(P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None, P_surface: float=EARTH_ATM, T_surface: float=293, dT: float=1, dP: Union[float, None]=None, max_workers: Union[int, None]=None, batch_size: Union[int, None]=None, executor: Union[Executor, None]=None) -> dict[str, np.ndarray]:
+
+    results = _map_batches(seafloor_feedback_batch, P_seafloor, T_seafloor, composition, alkalinity, carbon_molality, pH, {'minerals': minerals, 'P_surface': P_surface, 'T_surface': T_surface, 'dT': dT, 'dP': dP}, max_workers, batch_size, executor)
+
+    return {k: np.concatenate([r[k] for r in results]) for k in results[0]}
+
 if __name__ == '__main__':
 
     sal = 1
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+
+from collections import OrderedDict
+from typing import Any, Union
+
+
+def quantize(value: Any, significant_digits: int) -> Any:
+
+    # equal states within the tolerance map onto the same key
+    if isinstance(value, dict):
+        return [[str(k), quantize(v, significant_digits)] for k, v in sorted(value.items())]
+    if isinstance(value, (list, tuple)):
+        return [quantize(v, significant_digits) for v in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) or hasattr(value, '__float__'):
+        x = float(value)
+        if math.isnan(x) or math.isinf(x):
+            return repr(x)
+        return f'{x:.{significant_digits - 1}e}' if x != 0 else '0'
+
+    return repr(value)
+
+
+class PhreeqcCache:
+
+    def __init__(self, maxsize: int=100_000, path: Union[str, None]=None, significant_digits: int=10):
+
+        self.maxsize = maxsize
+        self.path = path
+        self.significant_digits = significant_digits
+
+        # values are kept serialised so callers never share a mutable result with the cache
+        self.memory: OrderedDict[str, tuple[str, str]] = OrderedDict()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._connection: Union[sqlite3.Connection, None] = None
+        self._connection_pid = -1
+
+    def key(self, function: str, database: str, inputs: dict[str, Any]) -> str:
+
+        canonical = json.dumps([function, database, quantize(inputs, self.significant_digits)], separators=(',', ':'))
+
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _database(self) -> Union[sqlite3.Connection, None]:
+
+        if self.path is None:
+            return None
+
+        # connections cannot cross a fork, so every worker process opens its own
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, database TEXT, value TEXT)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_database ON results (database)')
+            self._connection.commit()
+            self._connection_pid = os.getpid()
+
+        return self._connection
+
+    def _remember(self, key: str, database: str, value: str) -> None:
+
+        self.memory[key] = (database, value)
+        self.memory.move_to_end(key)
+
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Union[Any, None]:
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return json.loads(self.memory[key][1])
+
+        connection = self._database()
+
+        if connection is not None:
+            row = connection.execute('SELECT database, value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self.disk_hits += 1
+                return json.loads(row[1])
+
+        self.misses += 1
+
+        return None
+
+    def put(self, key: str, database: str, value: Any) -> None:
+
+        serialised = json.dumps(value, default=float)
+
+        self._remember(key, database, serialised)
+
+        connection = self._database()
+
+        if connection is not None:
+            connection.execute('INSERT OR REPLACE INTO results (key, database, value) VALUES (?, ?, ?)', (key, database, serialised))
+            connection.commit()
+
+    def invalidate(self, database: Union[str, None]=None) -> None:
+
+        # drops every entry, or only those computed with one database file
+        if database is None:
+            self.memory.clear()
+        else:
+            for key in [k for k, (d, _) in self.memory.items() if d.startswith(database)]:
+                del self.memory[key]
+
+        connection = self._database()
+
+        if connection is not None:
+            if database is None:
+                connection.execute('DELETE FROM results')
+            else:
+                connection.execute('DELETE FROM results WHERE substr(database, 1, ?) = ?', (len(database), database))
+            connection.commit()
+
+    def stats(self) -> dict[str, Union[int, float]]:
+
+        hits = self.memory_hits + self.disk_hits
+        calls = hits + self.misses
+
+        return {
+            'hits': hits,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / calls if calls > 0 else 0.0,
+            'size': len(self.memory)
+        }
+
+    def reset_stats(self) -> None:
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
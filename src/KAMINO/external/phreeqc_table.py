@@ -0,0 +1,318 @@
+import json
+import numpy as np
+
+from scipy.interpolate import RegularGridInterpolator # type: ignore
+from scipy.optimize import root_scalar # type: ignore
+from typing import Any, Union
+from numpy.typing import ArrayLike
+
+from constants import EARTH_ATM
+from solvers import SolverResult
+from ocean import seawater_composition
+from external import phreeqc
+
+# Tables store PHREEQC outputs sampled on a regular grid. Values live in a .npy file that is
+# memory-mapped on load, the axes and settings in a .json file next to it. Axes listed in
+# log_axes are interpolated in log10, outputs listed in log_outputs are interpolated as log10.
+
+PARTIAL_PRESSURE_AXES = ('P', 'T', 'alkalinity', 'carbon_molality', 'salinity')
+PARTIAL_PRESSURE_OUTPUTS = ('P_CO2', 'P_H2O', 'pH')
+
+SEAFLOOR_AXES = ('P', 'T', 'alkalinity', 'carbon_molality', 'salinity')
+
+AXIS_RTOL = 1e-12 # queries this close to the first or last node count as on the grid
+
+
+def _coarse_indices(n: int) -> np.ndarray:
+    # every other grid point, always keeping both ends so the coarse grid spans the same domain
+    return np.unique(np.r_[np.arange(0, n, 2), n - 1])
+
+
+class PhreeqcTable:
+
+    def __init__(self, path: str, method: str='linear'):
+
+        with open(f'{path}.json', 'r') as file:
+            meta: dict[str, Any] = json.load(file)
+
+        self.path = path
+        self.kind: str = meta['kind']
+        self.axis_names: list[str] = meta['axis_names']
+        self.axes = [np.asarray(a, dtype=np.float64) for a in meta['axes']]
+        self.log_axes: list[str] = meta['log_axes']
+        self.outputs: list[str] = meta['outputs']
+        self.log_outputs: list[str] = meta['log_outputs']
+        self.minerals: list[str] = meta['minerals']
+        self.validation: dict[str, dict[str, float]] = meta['validation']
+
+        self.values = np.load(f'{path}.npy', mmap_mode='r')
+
+        grid = [self._transform_axis(name, axis) for name, axis in zip(self.axis_names, self.axes)]
+        self.interpolator = RegularGridInterpolator(grid, self.values, method=method, bounds_error=False, fill_value=np.nan)
+
+        # the same data on every other node, used for the Richardson-style error estimate
+        coarse = [_coarse_indices(len(axis)) for axis in grid]
+        coarse_values = np.asarray(self.values[np.ix_(*coarse)])
+        self.coarse_interpolator = RegularGridInterpolator([axis[c] for axis, c in zip(grid, coarse)], coarse_values, method='linear', bounds_error=False, fill_value=np.nan)
+
+    def _transform_axis(self, name: str, x: ArrayLike) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        return np.log10(x) if name in self.log_axes else x
+
+    def _snap_to_axis(self, name: str, x: ArrayLike) -> np.ndarray:
+
+        # inputs a rounding error outside the grid, e.g. a salinity summed back from its composition, are moved onto the edge
+        axis = self.axes[self.axis_names.index(name)]
+        lower, upper = min(axis[0], axis[-1]), max(axis[0], axis[-1])
+        x = np.asarray(x, dtype=np.float64)
+
+        on_edge = np.isclose(x, lower, rtol=AXIS_RTOL, atol=0) | np.isclose(x, upper, rtol=AXIS_RTOL, atol=0)
+
+        return np.where(on_edge, np.clip(x, lower, upper), x)
+
+    def query(self, return_error: bool=False, **inputs: ArrayLike) -> Union[dict[str, np.ndarray], tuple[dict[str, np.ndarray], dict[str, np.ndarray]]]:
+
+        missing = [name for name in self.axis_names if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing table inputs {missing}")
+
+        arrays = np.broadcast_arrays(*[self._transform_axis(name, self._snap_to_axis(name, inputs[name])) for name in self.axis_names])
+        points = np.stack([a.ravel() for a in arrays], axis=-1)
+        shape = arrays[0].shape
+
+        interpolated = self.interpolator(points)
+        result = {name: self._untransform_output(name, interpolated[:, i]).reshape(shape) for i, name in enumerate(self.outputs)}
+
+        if not return_error:
+            return result
+
+        # linear interpolation error falls as h^2, so the fine-grid error is about a third of the coarse-fine difference
+        coarse = self.coarse_interpolator(points)
+        error = {}
+        for i, name in enumerate(self.outputs):
+            difference = np.abs(interpolated[:, i] - coarse[:, i]) / 3
+            if name in self.log_outputs:
+                difference = result[name].ravel() * (10 ** difference - 1)
+            error[name] = difference.reshape(shape)
+
+        return result, error
+
+    def _untransform_output(self, name: str, value: np.ndarray) -> np.ndarray:
+        return 10 ** value if name in self.log_outputs else value
+
+
+class PartialPressureTable(PhreeqcTable):
+
+    # drop-in replacements for the functions of external/phreeqc.py, composition is reduced to its salinity
+
+    def find_surface_state(self, P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple:
+
+        if pH is not None or alkalinity is None or carbon_molality is None:
+            raise ValueError("Partial pressure tables are sampled in alkalinity and carbon molality")
+
+        salinity = sum(np.asarray(v, dtype=np.float64) for v in composition.values())
+
+        result = self.query(P=P, T=T, alkalinity=alkalinity, carbon_molality=carbon_molality, salinity=salinity)
+        outputs = tuple(result[name] for name in ('P_CO2', 'P_H2O', 'pH')) + (np.asarray(alkalinity, dtype=np.float64),)
+
+        return tuple(float(x) if np.ndim(x) == 0 else x for x in outputs)
+
+    def find_partial_pressures(self, P: ArrayLike, T: ArrayLike, composition: dict[str, ArrayLike], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple:
+
+        P_CO2, P_H2O, _, _ = self.find_surface_state(P, T, composition, alkalinity, carbon_molality, pH)
+
+        return P_CO2, P_H2O
+
+    def _solve_alkalinity(self, P: float, T: float, P_CO2: float, composition: dict[str, float], carbon_molality: float) -> tuple[float, SolverResult]:
+
+        # P_CO2 falls monotonically with alkalinity, bracketed by the table's own alkalinity axis
+        alkalinity_axis = self.axes[self.axis_names.index('alkalinity')]
+
+        def log_P_CO2_residual(log_alkalinity: float) -> float:
+            return float(np.log10(self.find_partial_pressures(P, T, composition, 10 ** log_alkalinity, carbon_molality)[0] / P_CO2))
+
+        result = root_scalar(log_P_CO2_residual, bracket=(np.log10(alkalinity_axis[0]), np.log10(alkalinity_axis[-1])), method='brentq')  # type: ignore
+
+        if not result.converged:  # type: ignore
+            raise ValueError("Root finding did not converge")
+
+        return 10 ** result.root, SolverResult(result.root, result.iterations, result.function_calls, True)  # type: ignore
+
+    def reverse_partial_pressure(self, P: float, T: float, P_CO2: float, composition: dict[str, float], carbon_molality: float, find_alkalinity: bool=False) -> float:
+
+        alkalinity, _ = self._solve_alkalinity(P, T, P_CO2, composition, carbon_molality)
+
+        if find_alkalinity:
+            return alkalinity
+
+        return self.find_surface_state(P, T, composition, alkalinity, carbon_molality)[2]
+
+    def reverse_partial_pressure_fused(self, P: float, T: float, P_CO2: float, composition: dict[str, float], carbon_molality: float, pH_guess: float=8.0, bracket: tuple[float, float]=(0, 14), pH_step: float=0.1, xtol: float=1e-6) -> tuple[float, float, SolverResult]:
+
+        alkalinity, result = self._solve_alkalinity(P, T, P_CO2, composition, carbon_molality)
+        pH = self.find_surface_state(P, T, composition, alkalinity, carbon_molality)[2]
+
+        return pH, alkalinity, result
+
+
+class SeafloorTable(PhreeqcTable):
+
+    def seafloor_equilbrium(self, P_seafloor: ArrayLike, T_seafloor: ArrayLike, composition: dict[str, ArrayLike], minerals: list[str], alkalinity: Union[ArrayLike, None]=None, carbon_molality: Union[ArrayLike, None] = None, pH: Union[ArrayLike, None]=None) -> tuple:
+
+        if sorted(minerals) != sorted(self.minerals):
+            raise ValueError(f"Table was built for {self.minerals}, not {minerals}")
+        if pH is not None or alkalinity is None or carbon_molality is None:
+            raise ValueError("Seafloor tables are sampled in alkalinity and carbon molality")
+
+        salinity = sum(np.asarray(v, dtype=np.float64) for v in composition.values())
+
+        result = self.query(P=P_seafloor, T=T_seafloor, alkalinity=alkalinity, carbon_molality=carbon_molality, salinity=salinity)
+
+        def scalar(x: np.ndarray) -> Union[float, np.ndarray]:
+            return float(x) if np.ndim(x) == 0 else x
+
+        new_composition = {k: scalar(result[k]) for k in composition if k in result}
+
+        return new_composition, scalar(result['alkalinity']), scalar(result['carbon_molality'])
+
+
+def load_table(path: str, method: str='linear') -> PhreeqcTable:
+
+    with open(f'{path}.json', 'r') as file:
+        kind = json.load(file)['kind']
+
+    if kind == 'partial_pressure':
+        return PartialPressureTable(path, method)
+    if kind == 'seafloor':
+        return SeafloorTable(path, method)
+
+    raise ValueError(f"Unknown table kind '{kind}'")
+
+
+def _grid_points(axes: list[np.ndarray]) -> list[np.ndarray]:
+    return [g.ravel() for g in np.meshgrid(*axes, indexing='ij')]
+
+
+def _random_points(axes: list[np.ndarray], axis_names: list[str], log_axes: list[str], n: int, seed: int) -> list[np.ndarray]:
+
+    rng = np.random.default_rng(seed)
+    points = []
+
+    for name, axis in zip(axis_names, axes):
+        if name in log_axes:
+            points.append(10 ** rng.uniform(np.log10(axis[0]), np.log10(axis[-1]), n))
+        else:
+            points.append(rng.uniform(axis[0], axis[-1], n))
+
+    return points
+
+
+def _save_table(path: str, kind: str, axis_names: list[str], axes: list[np.ndarray], log_axes: list[str], outputs: list[str], log_outputs: list[str], minerals: list[str], values: np.ndarray, dtype: type) -> None:
+
+    for i, name in enumerate(outputs):
+        if name in log_outputs:
+            values[..., i] = np.log10(values[..., i])
+
+    np.save(f'{path}.npy', values.astype(dtype))
+
+    meta = {
+        'kind': kind,
+        'axis_names': axis_names,
+        'axes': [axis.tolist() for axis in axes],
+        'log_axes': log_axes,
+        'outputs': outputs,
+        'log_outputs': log_outputs,
+        'minerals': minerals,
+        'validation': {}
+    }
+
+    with open(f'{path}.json', 'w') as file:
+        json.dump(meta, file, indent=4)
+
+
+def _record_validation(path: str, table: PhreeqcTable, points: list[np.ndarray], exact: dict[str, np.ndarray]) -> None:
+
+    # errors at random off-grid points, in log10 for log outputs
+    interpolated = table.query(**dict(zip(table.axis_names, points)))
+    assert isinstance(interpolated, dict)
+
+    validation = {}
+    for name in table.outputs:
+        if name in table.log_outputs:
+            error = np.log10(interpolated[name] / exact[name])
+        else:
+            error = interpolated[name] - exact[name]
+        validation[name] = {'max_error': float(np.nanmax(np.abs(error))), 'rms_error': float(np.sqrt(np.nanmean(error ** 2)))}
+
+    with open(f'{path}.json', 'r') as file:
+        meta = json.load(file)
+    meta['validation'] = validation
+    with open(f'{path}.json', 'w') as file:
+        json.dump(meta, file, indent=4)
+
+    table.validation = validation
+
+
+def build_partial_pressure_table(path: str, P: ArrayLike, T: ArrayLike, alkalinity: ArrayLike, carbon_molality: ArrayLike, salinity: ArrayLike, log_axes: tuple[str, ...]=('alkalinity', 'carbon_molality'), n_validation: int=64, max_workers: Union[int, None]=None, dtype: type=np.float32) -> PartialPressureTable:
+
+    axis_names = list(PARTIAL_PRESSURE_AXES)
+    axes = [np.sort(np.atleast_1d(np.asarray(a, dtype=np.float64))) for a in (P, T, alkalinity, carbon_molality, salinity)]
+    outputs = list(PARTIAL_PRESSURE_OUTPUTS)
+
+    def sample(points: list[np.ndarray]) -> dict[str, np.ndarray]:
+        P_points, T_points, alkalinity_points, C_points, salinity_points = points
+        P_CO2, P_H2O, pH, _ = phreeqc.find_surface_state_parallel(P_points, T_points, seawater_composition(salinity_points), alkalinity_points, C_points, max_workers=max_workers)
+        return {'P_CO2': P_CO2, 'P_H2O': P_H2O, 'pH': pH}
+
+    grid_values = sample(_grid_points(axes))
+    values = np.stack([grid_values[name] for name in outputs], axis=-1).reshape(*[len(a) for a in axes], len(outputs))
+
+    _save_table(path, 'partial_pressure', axis_names, axes, list(log_axes), outputs, ['P_CO2', 'P_H2O'], [], values, dtype)
+
+    table = PartialPressureTable(path)
+
+    if n_validation > 0:
+        points = _random_points(axes, axis_names, list(log_axes), n_validation, seed=0)
+        _record_validation(path, table, points, sample(points))
+
+    return table
+
+
+def build_seafloor_table(path: str, minerals: list[str], P: ArrayLike, T: ArrayLike, alkalinity: ArrayLike, carbon_molality: ArrayLike, salinity: ArrayLike, log_axes: tuple[str, ...]=('alkalinity', 'carbon_molality'), n_validation: int=64, max_workers: Union[int, None]=None, dtype: type=np.float32) -> SeafloorTable:
+
+    axis_names = list(SEAFLOOR_AXES)
+    axes = [np.sort(np.atleast_1d(np.asarray(a, dtype=np.float64))) for a in (P, T, alkalinity, carbon_molality, salinity)]
+    elements = list(seawater_composition(0.0).keys())
+    outputs = elements + ['alkalinity', 'carbon_molality']
+
+    def sample(points: list[np.ndarray]) -> dict[str, np.ndarray]:
+        P_points, T_points, alkalinity_points, C_points, salinity_points = points
+        new_composition, new_alkalinity, new_C = phreeqc.seafloor_equilbrium_parallel(P_points, T_points, seawater_composition(salinity_points), minerals, alkalinity_points, C_points, max_workers=max_workers)
+        return {**new_composition, 'alkalinity': new_alkalinity, 'carbon_molality': new_C}
+
+    grid_values = sample(_grid_points(axes))
+    values = np.stack([grid_values[name] for name in outputs], axis=-1).reshape(*[len(a) for a in axes], len(outputs))
+
+    _save_table(path, 'seafloor', axis_names, axes, list(log_axes), outputs, [], list(minerals), values, dtype)
+
+    table = SeafloorTable(path)
+
+    if n_validation > 0:
+        points = _random_points(axes, axis_names, list(log_axes), n_validation, seed=0)
+        _record_validation(path, table, points, sample(points))
+
+    return table
+
+
+if __name__ == '__main__':
+
+    table = build_partial_pressure_table(
+        'partial_pressure_table',
+        P=np.array([0.5, 1, 2, 5]) * EARTH_ATM,
+        T=np.linspace(273.15, 323.15, 11),
+        alkalinity=np.logspace(-4, -2, 9),
+        carbon_molality=np.logspace(-4, -2, 9),
+        salinity=np.linspace(0, 1, 5)
+    )
+
+    print(table.validation)
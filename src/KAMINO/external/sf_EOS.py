@@ -3,33 +3,149 @@
 from seafreeze import seafreeze as sf
 # NOTE: "The SeaFreeze package allows to compute the thermodynamic and elastic properties of pure water, ice polymorphs (Ih, II, III, V VI and ice VII/ice X) up to 100 GPa and 10,000K and aqueous NaCl solution up to 8GPa and 2,000K."
 
+import warnings
 import numpy as np
 from scipy.optimize import root_scalar
 from tqdm import tqdm
+from typing import Callable, Union
+from numpy.typing import ArrayLike
 
+from external.sf_table import SeaFreezeTable, load_table
+from profiling import timer, count
 
-def EOS(P: float, T: float, salinity: float, property: str) -> float:
 
-    PTm = np.empty((1,), dtype='object')
-    PTm[0] = (P * 1e-6, T, salinity)
+# SeaFreeze evaluates (P, T, m) grids orders of magnitude faster than scattered points, so scattered
+# points are gathered from the grid spanned by their unique coordinates, one salinity at a time
+MAX_GRID_POINTS = 250_000
 
-    out = sf.getProp(PTm, 'NaClaq')
-    
-    if property == 'S' or property == 'entropy':
-        return out.S[0]
-    if property == 'rho' or property == 'density':
-        return out.rho[0]
-    else:
-        raise ValueError("Invalid property")
-    
-def phase(P: float, T: float, salinity: float) -> str:
-    
-    PTm = np.empty((1,), dtype='object')
-    PTm[0] = (P * 1e-6, T, salinity)
+# set by enable_table
+EOS_table: Union[SeaFreezeTable, None] = None
+
+PROPERTIES = {
+    'S': 'S', 'entropy': 'S',
+    'rho': 'rho', 'density': 'rho',
+    'cp': 'Cp', 'heat_capacity': 'Cp',
+    'alpha': 'alpha', 'thermal_expansivity': 'alpha'
+}
+
+
+def _flatten(P: ArrayLike, T: ArrayLike, salinity: ArrayLike) -> tuple[tuple[int, ...], np.ndarray, np.ndarray, np.ndarray]:
+
+    shape = np.broadcast(P, T, salinity).shape
+    P, T, salinity = (np.array(a, dtype=np.float64).ravel() for a in np.broadcast_arrays(P, T, salinity))
+
+    return shape, P, T, salinity
+
+
+def _on_grid(function: Callable[[np.ndarray], dict[str, np.ndarray]], P: ArrayLike, T: ArrayLike, salinity: ArrayLike, names: tuple[str, ...]) -> dict[str, np.ndarray]:
+
+    _, P, T, salinity = _flatten(P, T, salinity)
+    results = {name: np.full(P.shape, np.nan) for name in names}
+
+    def gather(index: np.ndarray) -> None:
+
+        P_unique, P_inverse = np.unique(P[index], return_inverse=True)
+        T_unique, T_inverse = np.unique(T[index], return_inverse=True)
+
+        if len(P_unique) * len(T_unique) > MAX_GRID_POINTS and len(index) > 1:
+            order = index[np.lexsort((T[index], P[index]))]
+            gather(order[:len(order) // 2])
+            gather(order[len(order) // 2:])
+            return
+
+        PTm = np.empty((3,), dtype='object')
+        PTm[0], PTm[1], PTm[2] = P_unique * 1e-6, T_unique, salinity[index[:1]]
+
+        for name, values in function(PTm).items():
+            results[name][index] = np.reshape(values, (len(P_unique), len(T_unique)))[P_inverse, T_inverse]
+
+    for m in np.unique(salinity):
+        gather(np.flatnonzero(salinity == m))
+
+    return results
+
+
+def enable_table(path: str, P: Union[ArrayLike, None]=None, T: Union[ArrayLike, None]=None, salinity: Union[ArrayLike, None]=None) -> SeaFreezeTable:
+
+    # points inside the table are interpolated from it, everything else still goes to SeaFreeze
+    global EOS_table
+    EOS_table = load_table(path, P, T, salinity)
+
+    return EOS_table
+
+def disable_table() -> None:
+
+    global EOS_table
+    EOS_table = None
+
+
+def EOS_properties(P: ArrayLike, T: ArrayLike, salinity: ArrayLike, properties: tuple[str, ...]) -> dict[str, Union[float, np.ndarray]]:
+
+    for property in properties:
+        if property not in PROPERTIES:
+            raise ValueError("Invalid property")
+
+    if EOS_table is not None and np.ndim(P) == np.ndim(T) == np.ndim(salinity) == 0:
+        point = EOS_table.lookup_point(float(P), float(T), float(salinity), tuple(PROPERTIES[p] for p in properties))
+        if point is not None:
+            return {property: point[PROPERTIES[property]] for property in properties}
+
+    shape, P, T, salinity = _flatten(P, T, salinity)
+    results = {property: np.empty(P.shape) for property in properties}
+
+    outside = np.ones(P.shape, dtype=bool)
+    if EOS_table is not None:
+        inside = EOS_table.contains(P, T, salinity)
+        interpolated = EOS_table.lookup(P[inside], T[inside], salinity[inside], tuple(PROPERTIES[p] for p in properties))
+        for property in properties:
+            results[property][inside] = interpolated[PROPERTIES[property]]
+        outside = ~inside
+
+    if outside.any():
+
+        def evaluate(PTm: np.ndarray) -> dict[str, np.ndarray]:
+            with timer('seafreeze.getProp'):
+                out = sf.getProp(PTm, 'NaClaq')
+            return {property: getattr(out, PROPERTIES[property]) for property in properties}
+
+        exact = _on_grid(evaluate, P[outside], T[outside], salinity[outside], properties)
+        for property in properties:
+            results[property][outside] = exact[property]
+
+    if shape == ():
+        return {property: float(values[0]) for property, values in results.items()}
+
+    return {property: values.reshape(shape) for property, values in results.items()}
+
+
+def EOS(P: ArrayLike, T: ArrayLike, salinity: ArrayLike, property: str) -> Union[float, np.ndarray]:
+
+    return EOS_properties(P, T, salinity, (property,))[property]
     
-    out = sf.whichphase(PTm, solute='NaClaq')
+def phase(P: ArrayLike, T: ArrayLike, salinity: ArrayLike) -> Union[str, np.ndarray]:
 
-    return sf.phasenum2phase(out[0])
+    shape, P, T, salinity = _flatten(P, T, salinity)
+    out = np.full(P.shape, np.nan)
+
+    # only points inside the table whose cell holds a single phase are taken from it,
+    # points in cells straddling a phase boundary are resolved by SeaFreeze
+    exact = np.ones(P.shape, dtype=bool)
+    if EOS_table is not None:
+        inside = EOS_table.contains(P, T, salinity)
+        nearest, boundary = EOS_table.lookup_phase(P[inside], T[inside], salinity[inside])
+        out[inside] = np.where(nearest >= 0, nearest, np.nan)
+        exact[inside] = boundary
+
+    if exact.any():
+        with timer('seafreeze.whichphase'):
+            out[exact] = _on_grid(lambda PTm: {'phase': sf.whichphase(PTm, solute='NaClaq')}, P[exact], T[exact], salinity[exact], ('phase',))['phase']
+
+    phases = np.array([sf.phasenum2phase(int(p)) if np.isfinite(p) else None for p in out], dtype='object')
+
+    if shape == ():
+        return phases[0]
+
+    return phases.reshape(shape)
     
 
 def make_adiabat(P_start: float, T_start: float, P_end: float, salinity: float=0, num: int=100):
@@ -37,12 +153,10 @@ def make_adiabat(P_start: float, T_start: float, P_end: float, salinity: float=0
     P_arr = np.logspace(np.log10(P_start), np.log10(P_end), num)
     # P_arr = np.linspace(P_start, P_end, num)
     T_arr = np.empty_like(P_arr)
-    rho_arr = np.empty_like(P_arr)
 
     # Initial entropy at starting point
     S0 = EOS(P_start, T_start, salinity, 'entropy')
     T_arr[0] = T_start
-    rho_arr[0] = EOS(P_start, T_start, salinity, 'density')
 
     print(f'Making adiabat at {P_start:.2e} Pa, {T_start:.0f} K...')
 
@@ -54,7 +168,57 @@ def make_adiabat(P_start: float, T_start: float, P_end: float, salinity: float=0
         res = root_scalar(objective, bracket=[T_arr[i-1] - 50, T_arr[i-1] + 50], method='brentq')
         T_arr[i] = res.root
 
-        rho_arr[i] = EOS(P_arr[i], T_arr[i], salinity, 'density')
+        count('make_adiabat.brentq_iterations', res.iterations)
+        count('make_adiabat.brentq_function_calls', res.function_calls)
+
+    # densities of all levels in one SeaFreeze call
+    rho_arr = EOS(P_arr, T_arr, salinity, 'density')
+
+    return P_arr, T_arr, rho_arr
+
+
+def make_adiabat_batch(P_start: ArrayLike, T_start: ArrayLike, P_end: ArrayLike, salinity: ArrayLike=0, num: int=100, xtol: float=1e-9, maxiter: int=20) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    # one adiabat per (P_start, T_start, P_end, salinity), returned as (n, num) arrays, or (num,) for scalar inputs
+    scalar = np.broadcast(P_start, T_start, P_end, salinity).shape == ()
+    P_start, T_start, P_end, salinity = (np.atleast_1d(np.array(a, dtype=np.float64)) for a in np.broadcast_arrays(P_start, T_start, P_end, salinity))
+
+    # same pressure levels as make_adiabat
+    P_arr = np.logspace(np.log10(P_start), np.log10(P_end), num, axis=-1)
+    m_arr = np.repeat(salinity[:, None], num, axis=1)
+
+    start = EOS_properties(P_start, T_start, salinity, ('entropy', 'density', 'heat_capacity', 'thermal_expansivity'))
+
+    # Newton on S(P_i, T_i) = S0 for every level at once, with dS/dT = c_p / T at constant P,
+    # started from the adiabat for constant alpha / (rho c_p)
+    gradient = start['thermal_expansivity'] / (start['density'] * start['heat_capacity'])
+    T_arr = T_start[:, None] * np.exp(gradient[:, None] * (P_arr - P_start[:, None]))
+    S0 = np.repeat(start['entropy'][:, None], num, axis=1)
+
+    active = np.ones(T_arr.shape, dtype=bool)
+    active[:, 0] = False
+    T_arr[:, 0] = T_start
+
+    for _ in range(maxiter):
+        if not active.any():
+            break
+        count('make_adiabat_batch.newton_iterations')
+        props = EOS_properties(P_arr[active], T_arr[active], m_arr[active], ('entropy', 'heat_capacity'))
+        step = np.clip((props['entropy'] - S0[active]) * T_arr[active] / props['heat_capacity'], -50, 50)
+        T_arr[active] -= step
+        active[active] = ~(np.abs(step) <= xtol)
+
+    rho_arr = EOS(P_arr, T_arr, m_arr, 'density')
+
+    # unconverged levels are returned as NaN rather than as the last Newton iterate
+    if active.any():
+        failed = np.argwhere(active)
+        warnings.warn(f'Adiabat did not converge at {len(failed)} levels, (adiabat, level) {failed[:10].tolist()}{" ..." if len(failed) > 10 else ""} are NaN')
+        T_arr[active] = np.nan
+        rho_arr[active] = np.nan
+
+    if scalar:
+        return P_arr[0], T_arr[0], rho_arr[0]
 
     return P_arr, T_arr, rho_arr
 
@@ -68,3 +232,7 @@ if __name__ == '__main__':
     print(T_adiabat)
     print(rho_adiabat)
 
+    P_batch, T_batch, rho_batch = make_adiabat_batch(1e5, [280, 300, 320], 1e9, salinity=[0, 1.0, 0.5])
+
+    print(T_batch[:, -1])
+
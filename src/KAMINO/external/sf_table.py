@@ -0,0 +1,204 @@
+# type: ignore
+
+from seafreeze import seafreeze as sf
+
+import bisect
+import json
+import math
+import os
+import numpy as np
+
+from importlib.metadata import version
+from typing import Union
+from numpy.typing import ArrayLike
+
+# Precomputed SeaFreeze NaClaq properties and phases on a (log P, T, salinity) grid. Values are
+# stored as .npy files that are memory-mapped on load, with the grid and SeaFreeze version in a
+# .json file next to them. A table built with another SeaFreeze version is rebuilt on load.
+
+TABLE_PROPERTIES = ('S', 'rho', 'Cp', 'alpha')
+
+# the NaClaq EOS of SeaFreeze is only valid up to 8 GPa, nodes above it hold NaN and phase -1
+SEAFREEZE_P_MAX = 8e9
+
+DEFAULT_P = np.geomspace(1e5, SEAFREEZE_P_MAX, 251)
+DEFAULT_T = np.linspace(240, 500, 261)
+DEFAULT_SALINITY = np.linspace(0, 2, 5)
+
+
+def seafreeze_version() -> str:
+    return version('seafreeze')
+
+
+class SeaFreezeTable:
+
+    def __init__(self, path: str):
+
+        with open(f'{path}.json', 'r') as file:
+            meta = json.load(file)
+
+        self.path = path
+        self.version: str = meta['version']
+        self.P = np.asarray(meta['P'], dtype=np.float64)
+        self.T = np.asarray(meta['T'], dtype=np.float64)
+        self.salinity = np.asarray(meta['salinity'], dtype=np.float64)
+        self.properties: list[str] = meta['properties']
+
+        self.log_P = np.log10(self.P)
+
+        # python lists for the single point path, where numpy call overhead would dominate
+        self._axes = (self.log_P.tolist(), self.T.tolist(), self.salinity.tolist())
+
+        # plain array views of the maps, fancy indexing an np.memmap is several times slower
+        self.values = np.asarray(np.load(f'{path}.npy', mmap_mode='r'))
+        self.phases = np.asarray(np.load(f'{path}_phase.npy', mmap_mode='r'))
+
+    def contains(self, P: np.ndarray, T: np.ndarray, salinity: np.ndarray) -> np.ndarray:
+
+        return (
+            (P >= self.P[0]) & (P <= self.P[-1]) &
+            (T >= self.T[0]) & (T <= self.T[-1]) &
+            (salinity >= self.salinity[0]) & (salinity <= self.salinity[-1])
+        )
+
+    def _corners(self, P: np.ndarray, T: np.ndarray, salinity: np.ndarray) -> tuple:
+
+        # lower and upper node of the cell around every point, with the weight of the upper node
+        corners = []
+        for axis, x in ((self.log_P, np.log10(P)), (self.T, T), (self.salinity, salinity)):
+            if len(axis) == 1:
+                i = np.zeros(x.shape, dtype=np.intp)
+                corners.append((i, i, np.zeros(x.shape)))
+                continue
+            i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+            corners.append((i, i + 1, (x - axis[i]) / (axis[i + 1] - axis[i])))
+
+        return tuple(corners)
+
+    def lookup(self, P: np.ndarray, T: np.ndarray, salinity: np.ndarray, properties: tuple[str, ...]) -> dict[str, np.ndarray]:
+
+        # trilinear interpolation, points are expected to lie inside the table
+        (P0, P1, wP), (T0, T1, wT), (m0, m1, wm) = self._corners(P, T, salinity)
+        columns = [self.properties.index(p) for p in properties]
+
+        # the eight corners of every cell gathered in one indexing operation
+        iP = np.stack([P0, P0, P0, P0, P1, P1, P1, P1])
+        iT = np.stack([T0, T0, T1, T1, T0, T0, T1, T1])
+        im = np.stack([m0, m1, m0, m1, m0, m1, m0, m1])
+        fP, fT, fm = np.stack([1 - wP, wP]), np.stack([1 - wT, wT]), np.stack([1 - wm, wm])
+        weights = (fP[:, None, None] * fT[None, :, None] * fm[None, None, :]).reshape(8, -1)
+
+        result = np.einsum('cn,cnk->nk', weights, self.values[iP, iT, im][..., columns])
+
+        return {p: result[:, i] for i, p in enumerate(properties)}
+
+    def lookup_point(self, P: float, T: float, salinity: float, properties: tuple[str, ...]) -> Union[dict[str, float], None]:
+
+        # trilinear interpolation of a single point, None outside the table
+        if not (self.P[0] <= P <= self.P[-1] and self.T[0] <= T <= self.T[-1] and self.salinity[0] <= salinity <= self.salinity[-1]):
+            return None
+
+        cell = []
+        for axis, x in zip(self._axes, (math.log10(P), T, salinity)):
+            if len(axis) == 1:
+                cell.append(((0, 1.0),))
+                continue
+            i = min(max(bisect.bisect_right(axis, x) - 1, 0), len(axis) - 2)
+            w = (x - axis[i]) / (axis[i + 1] - axis[i])
+            cell.append(((i, 1 - w), (i + 1, w)))
+
+        result = 0.0
+        for iP, fP in cell[0]:
+            for iT, fT in cell[1]:
+                for im, fm in cell[2]:
+                    result = result + fP * fT * fm * self.values[iP, iT, im]
+
+        return {p: float(result[self.properties.index(p)]) for p in properties}
+
+    def lookup_phase(self, P: np.ndarray, T: np.ndarray, salinity: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+
+        # phase of the nearest node, and whether the surrounding cell contains more than one phase;
+        # phase ids are never interpolated, so callers can resolve those boundary cells exactly
+        (P0, P1, wP), (T0, T1, wT), (m0, m1, wm) = self._corners(P, T, salinity)
+
+        cell = np.stack([self.phases[iP, iT, im] for iP in (P0, P1) for iT in (T0, T1) for im in (m0, m1)])
+        boundary = np.any(cell != cell[0], axis=0)
+
+        nearest = self.phases[np.where(wP < 0.5, P0, P1), np.where(wT < 0.5, T0, T1), np.where(wm < 0.5, m0, m1)]
+
+        return np.asarray(nearest), boundary
+
+
+def build_table(path: str, P: ArrayLike=DEFAULT_P, T: ArrayLike=DEFAULT_T, salinity: ArrayLike=DEFAULT_SALINITY) -> SeaFreezeTable:
+
+    P, T, salinity = (np.unique(np.asarray(a, dtype=np.float64)) for a in (P, T, salinity))
+
+    valid = P <= SEAFREEZE_P_MAX
+    if not valid.any():
+        raise ValueError(f"SeaFreeze tables need pressures up to {SEAFREEZE_P_MAX:.0e} Pa, the lowest one is {P[0]:.2e} Pa")
+
+    values = np.full((len(P), len(T), len(salinity), len(TABLE_PROPERTIES)), np.nan)
+    phases = np.full((len(P), len(T), len(salinity)), -1, dtype=np.int8)
+
+    print(f'Building SeaFreeze table with {values[..., 0].size} nodes...')
+
+    # SeaFreeze only evaluates grids with a single salinity in whichphase
+    for k, m in enumerate(salinity):
+
+        PTm = np.empty((3,), dtype='object')
+        PTm[0], PTm[1], PTm[2] = P[valid] * 1e-6, T, np.array([m])
+
+        out = sf.getProp(PTm, 'NaClaq')
+        for i, p in enumerate(TABLE_PROPERTIES):
+            values[valid, :, k, i] = np.reshape(getattr(out, p), (valid.sum(), len(T)))
+
+        phase_numbers = np.reshape(sf.whichphase(PTm, solute='NaClaq'), (valid.sum(), len(T)))
+        phases[valid, :, k] = np.where(np.isfinite(phase_numbers), phase_numbers, -1)
+
+    # replaced rather than overwritten, so tables that still map the old files keep working
+    for filename, array in ((f'{path}.npy', values), (f'{path}_phase.npy', phases)):
+        with open(f'{filename}.tmp', 'wb') as file:
+            np.save(file, array)
+        os.replace(f'{filename}.tmp', filename)
+
+    meta = {
+        'version': seafreeze_version(),
+        'P': P.tolist(),
+        'T': T.tolist(),
+        'salinity': salinity.tolist(),
+        'properties': list(TABLE_PROPERTIES)
+    }
+
+    with open(f'{path}.json', 'w') as file:
+        json.dump(meta, file, indent=4)
+
+    return SeaFreezeTable(path)
+
+
+def load_table(path: str, P: Union[ArrayLike, None]=None, T: Union[ArrayLike, None]=None, salinity: Union[ArrayLike, None]=None) -> SeaFreezeTable:
+
+    # reuses the table on disk unless SeaFreeze changed, a different grid was asked for or it holds
+    # values above SEAFREEZE_P_MAX, as tables built before the limit was applied do
+    if os.path.exists(f'{path}.json'):
+
+        table = SeaFreezeTable(path)
+
+        same_grid = all(
+            requested is None or np.array_equal(np.unique(np.asarray(requested, dtype=np.float64)), axis)
+            for requested, axis in ((P, table.P), (T, table.T), (salinity, table.salinity))
+        )
+
+        in_range = not np.isfinite(table.values[table.P > SEAFREEZE_P_MAX]).any()
+
+        if table.version == seafreeze_version() and same_grid and in_range:
+            return table
+
+        # a new SeaFreeze version keeps the grid of the old table
+        P, T, salinity = (table_axis if requested is None else requested for requested, table_axis in ((P, table.P), (T, table.T), (salinity, table.salinity)))
+
+    return build_table(
+        path,
+        DEFAULT_P if P is None else P,
+        DEFAULT_T if T is None else T,
+        DEFAULT_SALINITY if salinity is None else salinity
+    )
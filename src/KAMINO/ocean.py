@@ -1,9 +1,33 @@
 default_seawater_ratios = 'input/default_seawater_composition'
 
+import numpy as np
 import pandas as pd
 
-from external.phreeqc import find_partial_pressures, reverse_partial_pressure, seafloor_equilbrium # type: ignore
+from typing import Any, Sequence, Union
+from numpy.typing import ArrayLike
+
+from external.phreeqc import find_partial_pressures, reverse_partial_pressure, reverse_partial_pressure_fused, seafloor_equilbrium, speciate_batch # type: ignore
 from constants import ABSOLUTE_ZERO
+from solvers import SolverResult
+from profiling import timer
+
+def seawater_composition(salinity: ArrayLike) -> dict[str, Any]:
+
+    salinity = np.asarray(salinity, dtype=np.float64)
+    composition: dict[str, Any] = {}
+
+    with timer('ocean.read_composition'):
+        input_composition: pd.DataFrame = pd.read_table(default_seawater_ratios, sep='\s+') # type: ignore
+
+    ratio_total: float = 0
+
+    for i, row in input_composition.iterrows(): # type: ignore
+        composition[row['Element']] = row['Ratio'] # read as mol ratio
+        ratio_total += row['Ratio'] # type: ignore
+    for k in composition.keys():
+        composition[k] *= salinity / ratio_total
+
+    return composition
 
 class ocean:
     
@@ -17,31 +41,68 @@ class ocean:
 
         self.salinity = salinity # in mol of salt per kg water
 
-        self.composition: dict[str, float] = {} # in mol / kg
-
-        input_composition: pd.DataFrame = pd.read_table(default_seawater_ratios, sep='\s+') # type: ignore
-
-        ratio_total: float = 0
-
-        for i, row in input_composition.iterrows(): # type: ignore
-            self.composition[row['Element']] = row['Ratio'] # read as mol ratio
-            ratio_total += row['Ratio'] # type: ignore
-        for k in self.composition.keys():
-            self.composition[k] *= salinity / ratio_total
+        self.composition: dict[str, float] = seawater_composition(salinity) # in mol / kg
 
         self.pH: float
         self.alkalinity: float
         self.carbon_molality: float
+        self.setup_result: Union[SolverResult, None] = None
 
-    def setup(self, P_CO2: float, carbon_molality: float):
+        # per level speciation from column_chemistry, and the inputs it was computed for
+        self.column: dict[str, np.ndarray] = {}
+        self._column_inputs: Union[tuple[np.ndarray, np.ndarray, np.ndarray], None] = None
+
+    def setup(self, P_CO2: float, carbon_molality: float, fused: bool=True, pH_guess: Union[float, None]=None, bracket: tuple[float, float]=(0, 14)):
 
         self.carbon_molality = carbon_molality
-        self.pH = reverse_partial_pressure(self.P_surface, self.T_surface, P_CO2, self.composition, carbon_molality)
-        self.alkalinity = reverse_partial_pressure(self.P_surface, self.T_surface, P_CO2, self.composition, carbon_molality, find_alkalinity=True)
+
+        if fused:
+            # warm start from the last state, e.g. the previous time step or a neighbouring grid point
+            if pH_guess is None:
+                pH_guess = getattr(self, 'pH', 8.0)
+            self.pH, self.alkalinity, self.setup_result = reverse_partial_pressure_fused(self.P_surface, self.T_surface, P_CO2, self.composition, carbon_molality, pH_guess, bracket)
+        else:
+            self.pH = reverse_partial_pressure(self.P_surface, self.T_surface, P_CO2, self.composition, carbon_molality)
+            self.alkalinity = reverse_partial_pressure(self.P_surface, self.T_surface, P_CO2, self.composition, carbon_molality, find_alkalinity=True)
 
     def get_partial_pressures(self) -> tuple[float, float]: 
         return find_partial_pressures(self.P_surface, self.T_surface, self.composition, self.alkalinity, self.carbon_molality) # type: ignore
     
+    def column_chemistry(self, P: ArrayLike, T: ArrayLike, minerals: Sequence[str]=('Calcite', 'Aragonite'), rtol: float=1e-9) -> dict[str, np.ndarray]:
+
+        # speciates every level of a well mixed column in one PHREEQC run; levels whose pressure,
+        # temperature and totals are unchanged since the last call keep their previous results.
+        # This only saves runs when the totals stay put, e.g. a new temperature profile over part of
+        # the column. In planet.evolve the carbon and alkalinity change every step, so every level is
+        # speciated again; PHREEQC solves each initial solution from scratch and takes no starting guess
+        if getattr(self, 'alkalinity', None) is None or getattr(self, 'carbon_molality', None) is None:
+            raise ValueError("The ocean carbonate state is not set, run setup or set alkalinity and carbon_molality first")
+
+        P, T = np.broadcast_arrays(np.atleast_1d(np.asarray(P, dtype=np.float64)), np.atleast_1d(np.asarray(T, dtype=np.float64)))
+        totals = np.array([self.alkalinity, self.carbon_molality, *self.composition.values()], dtype=np.float64)
+
+        stale = np.ones(P.shape, dtype=bool)
+
+        if self._column_inputs is not None and set(self.column) >= {f'si_{m}' for m in minerals}:
+            P_last, T_last, totals_last = self._column_inputs
+            if P_last.shape == P.shape and np.allclose(totals, totals_last, rtol=rtol, atol=0):
+                stale = ~(np.isclose(P, P_last, rtol=rtol, atol=0) & np.isclose(T, T_last, rtol=rtol, atol=0))
+
+        if stale.any():
+
+            levels = speciate_batch(P[stale], T[stale], self.composition, self.alkalinity, self.carbon_molality, minerals=minerals)
+
+            if stale.all():
+                self.column = levels
+            else:
+                for k, v in levels.items():
+                    self.column[k][stale] = v
+
+            self._column_inputs = (P.copy(), T.copy(), totals)
+
+        # copies, later calls update self.column in place
+        return {k: v.copy() for k, v in self.column.items()}
+
     def seafloor_weathering(self):
 
         seawater_density = 1000
@@ -56,5 +117,6 @@ if __name__ == '__main__':
     o1.setup((400 * 1e-6) * 1e5, 0.001)
     print(o1.alkalinity)
     print(o1.pH)
+    print(o1.setup_result)
     P_CO2, P_H20 = o1.get_partial_pressures()
     print(100 * P_H20 / 1e5)
\ No newline at end of file
@@ -1,70 +1,66 @@
 # type: ignore
 
 import numpy as np
-import scipy.integrate as integrate
 import matplotlib.pyplot as plt
 
+from typing import Union
+from numpy.typing import ArrayLike
+
 h_b = 200
 a_0 = 50
 
-def K(z: float, h: float=h_b) -> float:
+# eddy diffusivities of the mixed layer, the thermocline between 0.9 h and 1.2 h, and the deep ocean
+K_mixed = 1e-1
+K_thermocline = 1e-5
+K_deep = 0.7e-5
+
+def K(z: ArrayLike, h: ArrayLike=h_b) -> Union[float, np.ndarray]:
     # res = float(np.where(z < 0.8 * h, 1e-2, 1e-4))
     # res = float(np.where((z < 1.2 * h) & (z > 0.8 * h), 1e-5, 1e-4))
 
-    if z < 0.9 * h_b:
-        Kz = 1e-1
-    elif 0.9 * h_b < z < 1.2 * h_b:
-        Kz = 1e-5
-    else:
-        Kz = 0.7e-5
+    z, h = np.asarray(z), np.asarray(h)
+
+    Kz = np.where(z < 0.9 * h, K_mixed, np.where(z < 1.2 * h, K_thermocline, K_deep))
+
+    return float(Kz) if Kz.ndim == 0 else Kz
+
+def dTdz(z: ArrayLike, I0: ArrayLike, a: ArrayLike, rho: float=1000, cp: float=4184, h: ArrayLike=h_b) -> Union[float, np.ndarray]:
+    return - (1 / K(z, h)) * (I0 / (rho * cp)) * np.exp(-np.asarray(z) / a)
+
+def _absorbed(z: np.ndarray, a: np.ndarray) -> np.ndarray:
+    # integral of exp(-s / a) from 0 to z
+    return a * -np.expm1(-z / a)
+
+def temperature_profiles(T0: ArrayLike, I0: ArrayLike, a: ArrayLike=a_0, h: ArrayLike=h_b, z: Union[ArrayLike, None]=None, rho: float=1000, cp: float=4184) -> np.ndarray:
 
-    return Kz
+    # K is constant within each layer, so dTdz integrates exactly layer by layer;
+    # profiles are broadcast over T0, I0, a and h and returned as (n_profiles, n_z), by default on 300 levels down to 3 km
+    if z is None:
+        z = np.linspace(0, 3000, num=300)
 
-def dTdz(z: float, I0: float, a: float, rho: float=1000, cp: float=4184) -> float:
-    return - (1 / K(z)) * (I0 / (rho * cp)) * np.exp(-z / a)
+    T0, I0, a, h = (np.atleast_1d(np.asarray(x, dtype=np.float64))[:, None] for x in np.broadcast_arrays(T0, I0, a, h))
+    z = np.asarray(z, dtype=np.float64)[None, :]
+
+    top, bottom = 0.9 * h, 1.2 * h
+
+    forcing = (
+        _absorbed(np.minimum(z, top), a) / K_mixed
+        + (_absorbed(np.clip(z, top, bottom), a) - _absorbed(top, a)) / K_thermocline
+        + (_absorbed(np.maximum(z, bottom), a) - _absorbed(bottom, a)) / K_deep
+    )
+
+    return T0 - I0 / (rho * cp) * forcing
 
 if __name__ == '__main__':
 
-    f = lambda z, T: dTdz(z, 272, a_0)
-   
-    T0 = 15
-    sol = integrate.solve_ivp(f, (0, 3000), [T0], t_eval=np.linspace(0, 3000, num=300))
-    
-    T1 = sol.y[0]
-    z1 = sol.t
-
-    T0 = 16
-    sol = integrate.solve_ivp(f, (0, 3000), [T0], t_eval=np.linspace(0, 3000, num=300))
-    
-    T2 = sol.y[0]
-    z2 = sol.t
-
-    T0 = 17
-    sol = integrate.solve_ivp(f, (0, 3000), [T0], t_eval=np.linspace(0, 3000, num=300))
-    
-    T3 = sol.y[0]
-    z3 = sol.t
-
-    T0 = 14
-    sol = integrate.solve_ivp(f, (0, 3000), [T0], t_eval=np.linspace(0, 3000, num=300))
-    
-    T4 = sol.y[0]
-    z4 = sol.t
-
-    T0 = 13
-    sol = integrate.solve_ivp(f, (0, 3000), [T0], t_eval=np.linspace(0, 3000, num=300))
-    
-    T5 = sol.y[0]
-    z5 = sol.t
-
-    plt.plot(T1, z1)
-    plt.plot(T2, z2)
-    plt.plot(T3, z3)
-    plt.plot(T4, z4)
-    plt.plot(T5, z5)
+    z = np.linspace(0, 3000, num=300)
+    profiles = temperature_profiles([15, 16, 17, 14, 13], 272, a_0, h_b, z)
+
+    for T in profiles:
+        plt.plot(T, z)
+
     plt.axhline(h_b)
     plt.axhline(a_0)
     plt.ylim([3000, 0])
     plt.xlim([0, 20])
     plt.savefig('profile.png')
-
@@ -1,10 +1,27 @@
+import time
 import numpy as np
 
-from constants import G
+from typing import Any, Callable, Union
+from numpy.typing import ArrayLike
+
+from constants import G, SPECIES_MMW
+from atmosphere import atmosphere, atmosphere_ensemble
+from ocean import ocean
+from solvers import broyden
+from external.phreeqc import find_surface_state
+from ocean_heat_profile import a_0, h_b, temperature_profiles
+
+def _with_coupled_species(x_gas: Union[dict[str, Any], None]) -> dict[str, Any]:
+
+    # CO2 and H2O are always present so the coupled solver can set their partial pressures
+    x_gas = {'N2': 1.0} if x_gas is None else dict(x_gas)
+    x_gas.setdefault('CO2', 0.0)
+    x_gas.setdefault('H2O', 0.0)
+    return x_gas
 
 class planet:
 
-    def __init__(self, R: float, M: float, ocean_depth: float, P_surface: float):
+    def __init__(self, R: float, M: float, ocean_depth: float, P_surface: float, salinity: float=0, x_gas: Union[dict[str, float], None]=None, planet_atmosphere: Union[atmosphere, None]=None):
         
         n_atm_levels = 30
         n_ocean_levels = 100
@@ -15,7 +32,6 @@ class planet:
         self.M_planet = M
         self.g = (G * M) / (R ** 2)
 
-        self.P_surface = P_surface
         self.T_surface = 0
 
         # ATMOSPHERE PROPERTIES
@@ -27,6 +43,11 @@ class planet:
         self.P_CO2 = 0
         self.P_H2O = 0
 
+        # planets of an ensemble are handed a view onto their row of the ensemble atmosphere
+        if planet_atmosphere is None:
+            planet_atmosphere = atmosphere(self.g, 4 * np.pi * R ** 2, P_surface, _with_coupled_species(x_gas))
+        self.atmosphere = planet_atmosphere
+
         # OCEAN PROPERTIES
 
         self.ocean_depth = ocean_depth
@@ -34,11 +55,34 @@ class planet:
         self.M_ocean = self.V_ocean * 1000
 
         self.z_ocean = np.linspace(0, -ocean_depth, n_ocean_levels)
-        self.P_ocean = P_surface + 1000 * self.g * self.z_ocean
-        self.P_seafloor = self.P_ocean[-1]
+        self.T_ocean = np.full(n_ocean_levels, np.nan)
+
+        self.ocean = ocean(self.g, 4 * np.pi * R ** 2, ocean_depth, P_surface, self.T_surface, salinity)
+        self.ocean_chemistry: dict[str, np.ndarray] = {}
 
         self.molality = {}
 
+        # CARBON CYCLE
+
+        self.carbon_inventory = 0 # mol of C in the atmosphere and ocean together
+        self.time = 0
+        self._coupled_state: Union[np.ndarray, None] = None
+        self._coupled_jacobian: Union[np.ndarray, None] = None
+
+    @property
+    def P_surface(self) -> float:
+        # the atmosphere owns the surface pressure, which an ensemble may change underneath this planet
+        return self.atmosphere.P_surface
+
+    @property
+    def P_ocean(self) -> np.ndarray:
+        # hydrostatic pressure of the ocean levels below the current surface pressure
+        return self.P_surface - 1000 * self.g * self.z_ocean
+
+    @property
+    def P_seafloor(self) -> float:
+        return float(self.P_ocean[-1])
+
     def update_atmosphere(self):
 
         # run PHREEQC here
@@ -54,7 +98,223 @@ class planet:
 
         self.T_surface = self.T_atm[-1]
 
-    def update_ocean_chemistry(self):
+    def set_ocean_heat_profile(self, I0: float, a: float=a_0, h: float=h_b):
+
+        # temperatures below the surface from the absorbed insolation, see ocean_heat_profile
+        self.T_ocean = temperature_profiles(self.T_surface, I0, a, h, -self.z_ocean)[0]
+
+    def set_ocean_adiabat(self, salinity: Union[float, None]=None):
+
+        # SeaFreeze is only needed for adiabatic oceans
+        from external.sf_EOS import make_adiabat_batch
+
+        salinity = self.ocean.salinity if salinity is None else salinity
+        P_adiabat, T_adiabat, _ = make_adiabat_batch(self.P_surface, self.T_surface, self.P_seafloor, salinity)
+
+        self.T_ocean = np.interp(self.P_ocean, P_adiabat, T_adiabat)
+
+    def update_ocean_chemistry(self, T_ocean: Union[ArrayLike, None]=None):
+
+        if T_ocean is not None:
+            self.T_ocean = np.asarray(T_ocean, dtype=np.float64)
+
+        if not np.all(np.isfinite(self.T_ocean)):
+            raise ValueError("The ocean temperature profile is not set or not finite, pass T_ocean or call set_ocean_heat_profile or set_ocean_adiabat first")
+        if getattr(self.ocean, 'alkalinity', None) is None or getattr(self.ocean, 'carbon_molality', None) is None:
+            raise ValueError("The ocean carbonate state is not set, run equilibrate or ocean.setup first")
+
+        self.ocean.P_surface = self.P_surface
+        self.ocean.T_surface = self.T_surface
+        self.ocean_chemistry = self.ocean.column_chemistry(self.P_ocean, self.T_ocean)
+        self.molality = dict(self.ocean.composition)
+
+    def _CO2_moles(self, P_CO2: float) -> float:
+        return P_CO2 * self.atmosphere.area / (self.g * SPECIES_MMW['CO2'])
+
+    def equilibrate(self, carbon_inventory: Union[float, None]=None, alkalinity: Union[float, None]=None, xtol: float=1e-6, ftol: float=1e-6, maxiter: int=30) -> dict[str, Any]:
+
+        # finds the P_CO2 and P_H2O at which the ocean is in equilibrium with the atmosphere, with the carbon
+        # split between atmospheric CO2 and dissolved inorganic carbon, and the surface pressure following from
+        # both; the unknowns are log10 P_CO2 and log10 P_H2O, every residual costs one PHREEQC run and the
+        # Jacobian of the last solve is reused as the starting Jacobian of the next
+        start = time.perf_counter()
+
+        if carbon_inventory is not None:
+            self.carbon_inventory = carbon_inventory
+        if alkalinity is not None:
+            self.ocean.alkalinity = alkalinity
+
+        if not self.carbon_inventory > 0:
+            raise ValueError(f"The carbon inventory has to be positive, got {self.carbon_inventory} mol")
+        if not self.T_surface > 0:
+            raise ValueError(f"The surface temperature has to be positive, got {self.T_surface} K")
+        if getattr(self.ocean, 'alkalinity', None) is None:
+            raise ValueError("The ocean alkalinity is not set, pass alkalinity or run ocean.setup first")
+
+        P_background = self.atmosphere.P_surface - self.atmosphere.P_gas['CO2'] - self.atmosphere.P_gas['H2O']
+
+        # the ocean state of every evaluated (P_CO2, P_H2O), the last evaluation may be a finite difference step
+        states: dict[tuple[float, float], dict[str, float]] = {}
+
+        def carbon_molality(P_CO2: float) -> float:
+            # what the atmosphere does not hold is dissolved, kept positive so PHREEQC always gets a solution
+            return max((self.carbon_inventory - self._CO2_moles(P_CO2)) / self.M_ocean, 1e-12)
+
+        def ocean_state(P_CO2: float, P_H2O: float) -> tuple[float, float, float, float]:
+            P_surface = P_background + P_CO2 + P_H2O
+            C = carbon_molality(P_CO2)
+            P_CO2_ocean, P_H2O_ocean, pH, _ = find_surface_state(P_surface, self.T_surface, self.ocean.composition, self.ocean.alkalinity, C)
+            states[(P_CO2, P_H2O)] = {'P_surface': P_surface, 'carbon_molality': C, 'pH': pH}
+            return P_CO2_ocean, P_H2O_ocean, pH, C
+
+        def residual(x: np.ndarray) -> np.ndarray:
+            P_CO2, P_H2O = (float(P) for P in 10 ** x)
+            P_CO2_ocean, P_H2O_ocean, _, _ = ocean_state(P_CO2, P_H2O)
+            return np.log10([P_CO2_ocean / P_CO2, P_H2O_ocean / P_H2O])
+
+        x0 = self._coupled_state
+        extra_calls = 0
+        if x0 is None:
+            # first guess with all carbon in the ocean, which bounds P_CO2 from above
+            P_CO2_ocean, P_H2O_ocean, _, _ = ocean_state(1.0, 1.0)
+            x0 = np.log10([P_CO2_ocean, P_H2O_ocean])
+            extra_calls = 1
+
+        result = broyden(residual, x0, self._coupled_jacobian, xtol=xtol, ftol=ftol, maxiter=maxiter, max_step=1.0)
+
+        P_CO2, P_H2O = (float(P) for P in 10 ** result.x)
+        if (P_CO2, P_H2O) not in states:
+            ocean_state(P_CO2, P_H2O)
+            extra_calls += 1
+        state = states[(P_CO2, P_H2O)]
+
+        if result.converged:
+            self._coupled_state = result.x
+            self._coupled_jacobian = result.jacobian
+            self._set_coupled_state(P_CO2, P_H2O)
+            # the alkalinity is an input of the solve and already holds its value, the pH is the one at the solution
+            self.ocean.pH = state['pH']
+
+        return {
+            'converged': result.converged,
+            'iterations': result.iterations,
+            'phreeqc_calls': result.function_calls + extra_calls,
+            'jacobian_evaluations': result.jacobian_evaluations,
+            'residual': float(np.max(np.abs(result.fx))),
+            'P_CO2': P_CO2,
+            'P_H2O': P_H2O,
+            'P_surface': float(state['P_surface']),
+            'carbon_molality': float(state['carbon_molality']),
+            'pH': state['pH'],
+            'wall_time': time.perf_counter() - start
+        }
+
+    def _set_coupled_state(self, P_CO2: float, P_H2O: float):
+
+        self.atmosphere.set_partial_pressure(P_CO2, 'CO2')
+        self.atmosphere.set_partial_pressure(P_H2O, 'H2O')
+
+        self.P_CO2 = P_CO2
+        self.P_H2O = P_H2O
+
+        self.ocean.P_surface = self.P_surface
+        self.ocean.T_surface = self.T_surface
+        self.ocean.carbon_molality = max((self.carbon_inventory - self._CO2_moles(P_CO2)) / self.M_ocean, 1e-12)
+
+    def evolve(self, t_end: float, dt: float, carbon_flux: Callable[[float, 'planet'], float]=lambda t, p: 0.0, alkalinity_flux: Callable[[float, 'planet'], float]=lambda t, p: 0.0, dt_min: float=1.0, dt_max: float=np.inf, max_change: float=0.05, target_iterations: int=3) -> list[dict[str, Any]]:
+
+        # steps the carbon inventory (mol/s) and ocean alkalinity (eq/s) forward and re-equilibrates after each step;
+        # the step grows while the solver converges quickly and is halved when it fails or log10 P_CO2
+        # moves by more than max_change; a step that does not converge at dt_min raises a ValueError, with
+        # the planet left at the last accepted step
+        if self._coupled_state is None:
+            report = self.equilibrate()
+            if not report['converged']:
+                raise ValueError(f"The initial equilibrium did not converge (residual {report['residual']:.2e})")
+
+        reports = []
+
+        while self.time < t_end:
+
+            dt = min(dt, t_end - self.time)
+
+            saved = (self.carbon_inventory, self.ocean.alkalinity, self._coupled_state, self._coupled_jacobian, self.ocean.pH)
+            log_P_CO2 = self._coupled_state[0] # type: ignore
+
+            self.carbon_inventory += carbon_flux(self.time, self) * dt
+            self.ocean.alkalinity += alkalinity_flux(self.time, self) * dt / self.M_ocean
+
+            try:
+                report = self.equilibrate()
+            except ValueError:
+                # e.g. a flux that drove the carbon inventory negative
+                self.carbon_inventory, self.ocean.alkalinity = saved[:2]
+                raise
+            change = abs(np.log10(report['P_CO2']) - log_P_CO2)
+
+            # too large a change is accepted once dt cannot shrink any further, a failed solve never is
+            if not report['converged'] or (change > max_change and dt > dt_min):
+                self.carbon_inventory, self.ocean.alkalinity, self._coupled_state, self._coupled_jacobian, self.ocean.pH = saved
+                # a failed solve does not touch the planet, but an accepted-then-rejected one has to be undone
+                if report['converged']:
+                    self._set_coupled_state(*(10 ** saved[2])) # type: ignore
+                reports.append({**report, 'time': self.time, 'dt': dt, 'accepted': False})
+                if dt <= dt_min:
+                    raise ValueError(f"The equilibrium did not converge at t = {self.time} s with dt = {dt} s (residual {report['residual']:.2e})")
+                dt = max(dt / 2, dt_min)
+                continue
+
+            self.time += dt
+            reports.append({**report, 'time': self.time, 'dt': dt, 'accepted': True})
+
+            if report['iterations'] <= target_iterations and change < max_change / 2:
+                dt = min(dt * 1.5, dt_max)
+
+        return reports
+
+class planet_ensemble:
+
+    # N planets built from arrays of R, M and ocean depth, with their atmospheres stored together in one
+    # atmosphere_ensemble so gas exchange can be applied to all of them at once; indexing gives a planet
+    # whose atmosphere is a view onto its row
+    def __init__(self, R: ArrayLike, M: ArrayLike, ocean_depth: ArrayLike, P_surface: ArrayLike, salinity: ArrayLike=0, x_gas: Union[dict[str, ArrayLike], None]=None):
+
+        R, M, ocean_depth, P_surface, salinity = np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (R, M, ocean_depth, P_surface, salinity)])
+
+        self.R_planet = R
+        self.M_planet = M
+        self.g = (G * M) / (R ** 2)
+
+        self.ocean_depth = ocean_depth
+        self.salinity = salinity
+        self.V_ocean = 4 * np.pi * ocean_depth * R ** 2
+        self.M_ocean = self.V_ocean * 1000
+
+        self.atmosphere = atmosphere_ensemble(self.g, 4 * np.pi * R ** 2, P_surface, _with_coupled_species(x_gas))
+
+        self._planets: dict[int, planet] = {}
+
+    def __len__(self) -> int:
+        return len(self.R_planet)
+
+    @property
+    def P_surface(self) -> np.ndarray:
+        return self.atmosphere.P_surface
+
+    @property
+    def P_seafloor(self) -> np.ndarray:
+        return self.P_surface + 1000 * self.g * self.ocean_depth
+
+    def __getitem__(self, i: int) -> planet:
 
-        pass
+        # planets are made on first access, thousands of members cost nothing until they are looked at
+        i = range(len(self))[i]
+        if i not in self._planets:
+            self._planets[i] = planet(
+                self.R_planet[i], self.M_planet[i], self.ocean_depth[i], self.P_surface[i], self.salinity[i],
+                planet_atmosphere=self.atmosphere[i]
+            )
+        return self._planets[i]
 
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
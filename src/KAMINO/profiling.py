@@ -0,0 +1,117 @@
+import atexit
+import functools
+import json
+import os
+import time
+
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Union
+
+# Opt-in timers and counters for the expensive stages of a run (PHREEQC runs, output parsing,
+# template I/O, SeaFreeze calls and root solver iterations). Nothing is recorded until enable()
+# is called, or KAMINO_PROFILE is set to the JSON file the report is written to when the run
+# exits. Every process keeps its own record, so work done in ProcessPoolExecutor workers only
+# appears in the report of the worker.
+
+PROFILING_enabled = False
+PROFILING_output: Union[str, None] = None
+
+_timers: dict[str, list[float]] = {} # stage -> [calls, total seconds, longest call]
+_counters: dict[str, int] = {}
+
+
+def enable(output: Union[str, None]=None) -> None:
+
+    global PROFILING_enabled, PROFILING_output
+
+    PROFILING_enabled = True
+    if output is not None:
+        PROFILING_output = output
+
+def disable() -> None:
+
+    global PROFILING_enabled
+    PROFILING_enabled = False
+
+def reset() -> None:
+
+    _timers.clear()
+    _counters.clear()
+
+
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+
+    if not PROFILING_enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record = _timers.setdefault(stage, [0, 0.0, 0.0])
+        record[0] += 1
+        record[1] += elapsed
+        record[2] = max(record[2], elapsed)
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+
+    def decorator(function: Callable[..., Any]) -> Callable[..., Any]:
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with timer(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def count(counter: str, n: int=1) -> None:
+
+    if PROFILING_enabled:
+        _counters[counter] = _counters.get(counter, 0) + int(n)
+
+
+def report() -> dict[str, Any]:
+
+    return {
+        'timers': {
+            stage: {'calls': int(calls), 'total': total, 'mean': total / calls, 'max': longest}
+            for stage, (calls, total, longest) in sorted(_timers.items())
+        },
+        'counters': dict(sorted(_counters.items()))
+    }
+
+def export(path: Union[str, None]=None) -> dict[str, Any]:
+
+    path = PROFILING_output if path is None else path
+    result = report()
+
+    if path is not None:
+        with open(path, 'w') as file:
+            json.dump(result, file, indent=4)
+
+    return result
+
+def summary() -> str:
+
+    lines = [f"{'stage':<40} {'calls':>8} {'total (s)':>12} {'mean (ms)':>12}"]
+    for stage, t in report()['timers'].items():
+        lines.append(f"{stage:<40} {t['calls']:>8} {t['total']:>12.4f} {1e3 * t['mean']:>12.4f}")
+    for counter, n in report()['counters'].items():
+        lines.append(f'{counter:<40} {n:>8}')
+
+    return '\n'.join(lines)
+
+
+def _export_at_exit() -> None:
+    if PROFILING_enabled and PROFILING_output is not None:
+        export()
+
+if os.environ.get('KAMINO_PROFILE'):
+    enable(os.environ['KAMINO_PROFILE'])
+
+atexit.register(_export_at_exit)
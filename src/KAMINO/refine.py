@@ -0,0 +1,147 @@
+import numpy as np
+
+from typing import Callable, NamedTuple, Union
+from numpy.typing import ArrayLike
+
+# Quadtree refinement of the zero contour of f(x, y). Cells of a coarse grid are split into four
+# while their corners change sign (or vary by more than variation_tol of the coarse range), and all
+# new nodes of one level are evaluated in a single call of f. Nodes are kept on an integer lattice
+# 2**max_depth times finer than the coarse grid, and the lattice maps onto x and y by interpolating
+# the coarse axes, so uneven axes keep their spacing.
+
+
+class BoundaryResult(NamedTuple):
+    x: np.ndarray
+    y: np.ndarray
+    values: np.ndarray
+    contours: list[np.ndarray]
+    evaluations: int
+
+
+def _crossing(p: np.ndarray, q: np.ndarray, fp: float, fq: float) -> np.ndarray:
+    return p + fp / (fp - fq) * (q - p)
+
+
+def _chain(segments: list[tuple[tuple, tuple]], points: dict[tuple, np.ndarray]) -> list[np.ndarray]:
+
+    # segments meet where they cross the same lattice edge, which joins them into polylines
+    by_edge: dict[tuple, list[int]] = {}
+    for k, (a, b) in enumerate(segments):
+        by_edge.setdefault(a, []).append(k)
+        by_edge.setdefault(b, []).append(k)
+
+    used = [False] * len(segments)
+    contours = []
+
+    for start in range(len(segments)):
+
+        if used[start]:
+            continue
+        used[start] = True
+
+        line = list(segments[start])
+
+        for forward in (True, False):
+            while True:
+                end = line[-1] if forward else line[0]
+                following = [k for k in by_edge[end] if not used[k]]
+                if not following:
+                    break
+                used[following[0]] = True
+                a, b = segments[following[0]]
+                new = b if a == end else a
+                if forward:
+                    line.append(new)
+                else:
+                    line.insert(0, new)
+
+        contours.append(np.array([points[edge] for edge in line]))
+
+    return contours
+
+
+def refine_sign_boundary(function: Callable[[np.ndarray, np.ndarray], ArrayLike], x_axis: ArrayLike, y_axis: ArrayLike, max_depth: int=3, variation_tol: Union[float, None]=None) -> BoundaryResult:
+
+    x_axis, y_axis = np.asarray(x_axis, dtype=np.float64), np.asarray(y_axis, dtype=np.float64)
+    scale = 2 ** max_depth
+
+    values: dict[tuple[int, int], float] = {}
+
+    def coordinates(nodes: list[tuple[int, int]]) -> tuple[np.ndarray, np.ndarray]:
+        i, j = np.array(nodes, dtype=np.float64).reshape(-1, 2).T / scale
+        return np.interp(i, np.arange(len(x_axis)), x_axis), np.interp(j, np.arange(len(y_axis)), y_axis)
+
+    def evaluate(nodes: set[tuple[int, int]]) -> None:
+        nodes_list = [n for n in nodes if n not in values]
+        if nodes_list:
+            result = np.asarray(function(*coordinates(nodes_list)), dtype=np.float64).ravel()
+            values.update(zip(nodes_list, result.tolist()))
+
+    def corners(cell: tuple[int, int], size: int) -> list[tuple[int, int]]:
+        i, j = cell
+        return [(i, j), (i + size, j), (i + size, j + size), (i, j + size)]
+
+    size = scale
+    cells = [(a * scale, b * scale) for a in range(len(x_axis) - 1) for b in range(len(y_axis) - 1)]
+    evaluate({node for cell in cells for node in corners(cell, size)})
+
+    coarse = np.array(list(values.values()))
+    threshold = None if variation_tol is None else variation_tol * (np.nanmax(coarse) - np.nanmin(coarse))
+
+    def changes_sign(cell: tuple[int, int], size: int) -> bool:
+        f = [values[n] for n in corners(cell, size)]
+        return bool(np.all(np.isfinite(f)) and min(f) < 0 <= max(f))
+
+    def needs_refinement(cell: tuple[int, int], size: int) -> bool:
+        if changes_sign(cell, size):
+            return True
+        f = [values[n] for n in corners(cell, size)]
+        return threshold is not None and bool(np.all(np.isfinite(f))) and max(f) - min(f) > threshold
+
+    leaves: list[tuple[tuple[int, int], int]] = []
+
+    for _ in range(max_depth):
+
+        refined = [cell for cell in cells if needs_refinement(cell, size)]
+        refined_set = set(refined)
+        leaves += [(cell, size) for cell in cells if cell not in refined_set]
+
+        size //= 2
+        cells = [(i + di, j + dj) for i, j in refined for di in (0, size) for dj in (0, size)]
+        evaluate({node for cell in cells for node in corners(cell, size)})
+
+    leaves += [(cell, size) for cell in cells]
+
+    # marching squares over the leaves that straddle the contour
+    segments: list[tuple[tuple, tuple]] = []
+    points: dict[tuple, np.ndarray] = {}
+
+    for cell, size in leaves:
+
+        if not changes_sign(cell, size):
+            continue
+
+        nodes = corners(cell, size)
+        x, y = coordinates(nodes)
+        f = [values[n] for n in nodes]
+
+        crossings = []
+        for k in range(4):
+            a, b = k, (k + 1) % 4
+            if (f[a] < 0) != (f[b] < 0):
+                edge = tuple(sorted((nodes[a], nodes[b])))
+                points[edge] = _crossing(np.array([x[a], y[a]]), np.array([x[b], y[b]]), f[a], f[b])
+                crossings.append(edge)
+
+        if len(crossings) == 2:
+            segments.append((crossings[0], crossings[1]))
+        elif len(crossings) == 4:
+            # saddle, resolved with the mean of the corners as the centre value
+            if (np.mean(f) < 0) == (f[0] < 0):
+                segments += [(crossings[0], crossings[1]), (crossings[2], crossings[3])]
+            else:
+                segments += [(crossings[3], crossings[0]), (crossings[1], crossings[2])]
+
+    x, y = coordinates(list(values))
+
+    return BoundaryResult(x, y, np.array(list(values.values())), _chain(segments, points), len(values))
@@ -0,0 +1,154 @@
+import numpy as np
+
+from typing import Callable, NamedTuple, Union
+from numpy.typing import ArrayLike
+
+
+class SolverResult(NamedTuple):
+    root: float
+    iterations: int
+    function_calls: int
+    converged: bool
+
+
+def safeguarded_secant(f: Callable[[float], float], x0: float, x1: Union[float, None]=None, bracket: tuple[float, float]=(-np.inf, np.inf), xtol: float=1e-8, ftol: float=0.0, maxiter: int=50) -> SolverResult:
+
+    lower, upper = bracket
+    function_calls = 0
+
+    def evaluate(x: float) -> float:
+        nonlocal function_calls
+        function_calls += 1
+        return f(x)
+
+    if x1 is None:
+        x1 = x0 + max(1e-2 * abs(x0), 1e-2)
+
+    xa, xb = float(np.clip(x0, lower, upper)), float(np.clip(x1, lower, upper))
+    fa = evaluate(xa)
+
+    if fa == 0 or abs(fa) <= ftol:
+        return SolverResult(xa, 0, function_calls, True)
+
+    fb = evaluate(xb)
+
+    # once two iterates straddle the root, every new step has to stay inside them
+    sign_change: Union[tuple[float, float, float, float], None] = None
+    if fa * fb < 0:
+        sign_change = (xa, fa, xb, fb) if xa < xb else (xb, fb, xa, fa)
+
+    for iteration in range(1, maxiter + 1):
+
+        if fb == 0 or abs(fb) <= ftol:
+            return SolverResult(xb, iteration - 1, function_calls, True)
+
+        x_new = xb - fb * (xb - xa) / (fb - fa) if fb != fa else np.nan
+
+        if sign_change is not None:
+            lo, _, hi, _ = sign_change
+            if not (lo < x_new < hi):
+                x_new = 0.5 * (lo + hi)
+        elif np.isnan(x_new):
+            x_new = xb + 2 * (xb - xa)
+
+        x_new = float(np.clip(x_new, lower, upper))
+
+        if x_new == xb:
+            # stuck against the bracket without finding a sign change
+            return SolverResult(xb, iteration, function_calls, False)
+
+        f_new = evaluate(x_new)
+
+        if sign_change is not None:
+            lo, f_lo, hi, f_hi = sign_change
+            sign_change = (x_new, f_new, hi, f_hi) if f_new * f_lo > 0 else (lo, f_lo, x_new, f_new)
+        elif f_new * fb < 0:
+            sign_change = (xb, fb, x_new, f_new) if xb < x_new else (x_new, f_new, xb, fb)
+
+        xa, fa, xb, fb = xb, fb, x_new, f_new
+
+        if abs(xb - xa) <= xtol:
+            return SolverResult(xb, iteration, function_calls, True)
+
+        if sign_change is not None and sign_change[2] - sign_change[0] <= xtol:
+            return SolverResult(xb, iteration, function_calls, True)
+
+    return SolverResult(xb, maxiter, function_calls, False)
+
+
+class BroydenResult(NamedTuple):
+    x: np.ndarray
+    fx: np.ndarray
+    jacobian: np.ndarray
+    iterations: int
+    function_calls: int
+    jacobian_evaluations: int
+    converged: bool
+
+
+def finite_difference_jacobian(f: Callable[[np.ndarray], np.ndarray], x: np.ndarray, fx: np.ndarray, step: float=1e-4) -> np.ndarray:
+
+    jacobian = np.empty((len(fx), len(x)))
+
+    for i in range(len(x)):
+        dx = np.zeros_like(x)
+        dx[i] = step * max(abs(x[i]), 1.0)
+        jacobian[:, i] = (f(x + dx) - fx) / dx[i]
+
+    return jacobian
+
+
+def broyden(f: Callable[[np.ndarray], ArrayLike], x0: ArrayLike, jacobian: Union[np.ndarray, None]=None, xtol: float=1e-8, ftol: float=1e-8, maxiter: int=30, fd_step: float=1e-4, max_step: Union[float, None]=None) -> BroydenResult:
+
+    # quasi-Newton with rank one updates; a Jacobian from an earlier solve can be passed back in, and a
+    # finite difference Jacobian is only formed when none is given or a step fails to reduce the residual
+    function_calls = 0
+    jacobian_evaluations = 0
+
+    def evaluate(x: np.ndarray) -> np.ndarray:
+        nonlocal function_calls
+        function_calls += 1
+        return np.asarray(f(x), dtype=np.float64)
+
+    def fresh_jacobian(x: np.ndarray, fx: np.ndarray) -> np.ndarray:
+        nonlocal jacobian_evaluations
+        jacobian_evaluations += 1
+        return finite_difference_jacobian(evaluate, x, fx, fd_step)
+
+    x = np.array(x0, dtype=np.float64)
+    fx = evaluate(x)
+
+    J = fresh_jacobian(x, fx) if jacobian is None else np.array(jacobian, dtype=np.float64)
+    J_is_fresh = jacobian is None
+
+    for iteration in range(1, maxiter + 1):
+
+        if np.max(np.abs(fx)) <= ftol:
+            return BroydenResult(x, fx, J, iteration - 1, function_calls, jacobian_evaluations, True)
+
+        dx = np.linalg.lstsq(J, -fx, rcond=None)[0]
+
+        if max_step is not None and np.max(np.abs(dx)) > max_step:
+            dx *= max_step / np.max(np.abs(dx))
+
+        x_new = x + dx
+        f_new = evaluate(x_new)
+
+        if not np.all(np.isfinite(f_new)) or np.linalg.norm(f_new) > np.linalg.norm(fx):
+            if not J_is_fresh:
+                # the reused or updated Jacobian has gone stale, rebuild it where we are and retry
+                J = fresh_jacobian(x, fx)
+                J_is_fresh = True
+                continue
+            if not np.all(np.isfinite(f_new)):
+                return BroydenResult(x, fx, J, iteration, function_calls, jacobian_evaluations, False)
+
+        J = J + np.outer(f_new - fx - J @ dx, dx) / (dx @ dx)
+        J_is_fresh = False
+
+        x, fx = x_new, f_new
+
+        if np.max(np.abs(dx)) <= xtol:
+            return BroydenResult(x, fx, J, iteration, function_calls, jacobian_evaluations, True)
+
+    return BroydenResult(x, fx, J, maxiter, function_calls, jacobian_evaluations, bool(np.max(np.abs(fx)) <= ftol))
@@ -0,0 +1,155 @@
+import json
+import os
+import numpy as np
+
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Union
+from numpy.typing import ArrayLike
+
+# A sweep evaluates a function over the Cartesian product of named parameter axes. Points are
+# numbered in C order over the axes and split into fixed size chunks. Every finished chunk is
+# written to {path}/chunk_{index}.npz as soon as it completes, next to a meta.json describing the
+# sweep, so an interrupted sweep picks up at the first missing chunk when it is run again.
+
+
+def _meta_path(path: str) -> str:
+    return os.path.join(path, 'meta.json')
+
+def _chunk_path(path: str, index: int) -> str:
+    return os.path.join(path, f'chunk_{index:06d}.npz')
+
+
+def _json_value(value: Any) -> Any:
+    # numpy arrays and scalars as lists and numbers, anything else by its repr
+    return value.tolist() if hasattr(value, 'tolist') else repr(value)
+
+def _same_sweep(stored: Any, requested: Any, rtol: float) -> bool:
+
+    # floats only have to agree to rtol, so kwargs recomputed on another backend or machine still match
+    if isinstance(stored, dict) and isinstance(requested, dict):
+        return stored.keys() == requested.keys() and all(_same_sweep(stored[k], requested[k], rtol) for k in stored)
+    if isinstance(stored, list) and isinstance(requested, list):
+        return len(stored) == len(requested) and all(_same_sweep(a, b, rtol) for a, b in zip(stored, requested))
+    if isinstance(stored, (int, float)) and isinstance(requested, (int, float)) and not isinstance(stored, bool) and not isinstance(requested, bool):
+        return bool(np.isclose(stored, requested, rtol=rtol, atol=0))
+    return stored == requested
+
+
+def _grid_points(axes: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    return {name: g.ravel() for name, g in zip(axes, np.meshgrid(*axes.values(), indexing='ij'))}
+
+
+def _run_chunk(job: tuple[Callable[..., Any], int, dict[str, np.ndarray], dict[str, Any], bool]) -> tuple[int, dict[str, np.ndarray]]:
+
+    function, index, points, kwargs, vectorized = job
+
+    if vectorized:
+        outputs = function(**points, **kwargs)
+        return index, {name: np.asarray(values, dtype=np.float64) for name, values in outputs.items()}
+
+    n = len(next(iter(points.values())))
+    results = [function(**{name: values[i] for name, values in points.items()}, **kwargs) for i in range(n)]
+
+    return index, {name: np.array([r[name] for r in results], dtype=np.float64) for name in results[0]}
+
+
+def _write_chunk(path: str, index: int, outputs: dict[str, np.ndarray]) -> None:
+
+    # written under a temporary name and moved into place, so a crash never leaves half a chunk
+    filename = _chunk_path(path, index)
+
+    with open(f'{filename}.tmp', 'wb') as file:
+        np.savez(file, **outputs)
+
+    os.replace(f'{filename}.tmp', filename)
+
+
+def completed_chunks(path: str) -> list[int]:
+
+    if not os.path.exists(_meta_path(path)):
+        return []
+
+    with open(_meta_path(path), 'r') as file:
+        n_chunks = json.load(file)['n_chunks']
+
+    return [i for i in range(n_chunks) if os.path.exists(_chunk_path(path, i))]
+
+
+def run_sweep(path: str, grid: dict[str, ArrayLike], function: Callable[..., Any], kwargs: Union[dict[str, Any], None]=None, chunk_size: int=64, vectorized: bool=False, max_workers: Union[int, None]=None, executor: Union[Executor, None]=None, sweep_name: Union[str, None]=None, rtol: float=1e-6) -> dict[str, np.ndarray]:
+
+    # function maps one point, given as keyword arguments named after the axes, to a dict of floats;
+    # with vectorized=True it is called once per chunk with arrays and returns a dict of arrays.
+    # The sweep on disk is identified by sweep_name, by default the qualified name of function without
+    # its module (which is __main__ when the defining file runs as a script), and by kwargs and axes to rtol
+    kwargs = {} if kwargs is None else kwargs
+    axes = {name: np.atleast_1d(np.asarray(axis, dtype=np.float64)) for name, axis in grid.items()}
+
+    n_points = int(np.prod([len(axis) for axis in axes.values()]))
+    n_chunks = -(-n_points // chunk_size)
+
+    meta = {
+        'function': function.__qualname__ if sweep_name is None else sweep_name,
+        'kwargs': json.loads(json.dumps(kwargs, sort_keys=True, default=_json_value)),
+        'axes': {name: axis.tolist() for name, axis in axes.items()},
+        'chunk_size': chunk_size,
+        'n_points': n_points,
+        'n_chunks': n_chunks
+    }
+
+    os.makedirs(path, exist_ok=True)
+
+    if os.path.exists(_meta_path(path)):
+        with open(_meta_path(path), 'r') as file:
+            stored = json.load(file)
+        if not _same_sweep(stored, meta, rtol):
+            raise ValueError(f"'{path}' holds a different sweep, remove it or choose another path")
+    else:
+        with open(_meta_path(path), 'w') as file:
+            json.dump(meta, file, indent=4)
+
+    done = set(completed_chunks(path))
+    todo = [i for i in range(n_chunks) if i not in done]
+
+    if todo:
+
+        print(f'Sweep {path}: {len(done)} of {n_chunks} chunks done, running {len(todo)}...')
+
+        points = _grid_points(axes)
+        jobs = [(function, i, {name: values[i * chunk_size:(i + 1) * chunk_size] for name, values in points.items()}, kwargs, vectorized) for i in todo]
+
+        if max_workers == 1 and executor is None:
+            for job in jobs:
+                _write_chunk(path, *_run_chunk(job))
+        else:
+            pool = executor if executor is not None else ProcessPoolExecutor(max_workers=max_workers)
+            try:
+                # chunks are stored in completion order, the file name keeps their place in the grid
+                for future in as_completed([pool.submit(_run_chunk, job) for job in jobs]):
+                    _write_chunk(path, *future.result())
+            finally:
+                if executor is None:
+                    pool.shutdown(cancel_futures=True)
+
+    return load_sweep(path)[1]
+
+
+def load_sweep(path: str) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+
+    # axes and outputs shaped like the grid, with NaN for points whose chunk has not finished
+    with open(_meta_path(path), 'r') as file:
+        meta = json.load(file)
+
+    axes = {name: np.asarray(axis) for name, axis in meta['axes'].items()}
+    shape = tuple(len(axis) for axis in axes.values())
+    chunk_size = meta['chunk_size']
+
+    outputs: dict[str, np.ndarray] = {}
+
+    for i in completed_chunks(path):
+        with np.load(_chunk_path(path, i)) as chunk:
+            for name in chunk.files:
+                if name not in outputs:
+                    outputs[name] = np.full(meta['n_points'], np.nan)
+                outputs[name][i * chunk_size:i * chunk_size + len(chunk[name])] = chunk[name]
+
+    return axes, {name: values.reshape(shape) for name, values in outputs.items()}
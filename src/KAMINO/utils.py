@@ -1,4 +1,38 @@
+from functools import lru_cache
 
+from profiling import timed
+
+
+# timed below the cache, so only reads that reach the disk are counted
+@lru_cache(maxsize=None)
+@timed('utils.read_template')
+def read_template(filename: str) -> tuple[str, ...]:
+
+    with open(filename, 'r') as file:
+        return tuple(file.readlines())
+
+
+def modify_lines(lines: list[str], modification_dict: dict[int, str]) -> list[str]:
+
+    lines = list(lines)
+
+    for line_number, new_content in modification_dict.items():
+        if 1 <= line_number <= len(lines):
+            lines[line_number - 1] = new_content + '\n'
+        else:
+            print(f"Line {line_number} is out of range. Skipping.")
+
+    return lines
+
+
+def insert_lines(content: list[str], lines: list[str], position: int) -> list[str]:
+
+    lines_with_newlines = [line if line.endswith('\n') else line + '\n' for line in lines]
+
+    return content[:position] + lines_with_newlines + content[position:]
+
+
+@timed('utils.modify_file_by_lines')
 def modify_file_by_lines(filename: str, new_filename: str, modification_dict: dict[int, str]) -> None:
 
     try:
@@ -7,11 +41,7 @@ def modify_file_by_lines(filename: str, new_filename: str, modification_dict: di
                 lines = file.readlines()
             
             # Apply modifications
-            for line_number, new_content in modification_dict.items():
-                if 1 <= line_number <= len(lines):
-                    lines[line_number - 1] = new_content + '\n'
-                else:
-                    print(f"Line {line_number} is out of range. Skipping.")
+            lines = modify_lines(lines, modification_dict)
             
             # Write the modified lines back to the file
             with open(new_filename, 'w') as file:
@@ -23,12 +53,12 @@ def modify_file_by_lines(filename: str, new_filename: str, modification_dict: di
         print(f"An unexpected error occurred: {e}")
 
 
+@timed('utils.insert_lines_into_file')
 def insert_lines_into_file(file_path: str, lines: list[str], position: int) -> None:
     with open(file_path, 'r') as f:
         content = f.readlines()
 
-    lines_with_newlines = [line if line.endswith('\n') else line + '\n' for line in lines]
-    updated_content = content[:position] + lines_with_newlines + content[position:]
+    updated_content = insert_lines(content, lines, position)
 
     with open(file_path, 'w') as f:
         f.writelines(updated_content)
@@ -1,10 +1,14 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
-from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Union
 
 from constants import *
 from external.phreeqc import *
+from sweep import run_sweep, load_sweep
+from refine import BoundaryResult, refine_sign_boundary
 
 n_P, n_T = 60, 64
 
@@ -12,8 +16,6 @@ P_seafloor = np.linspace(100, 2000, num=n_P) * EARTH_ATM
 #T_seafloor = np.concatenate([np.linspace(1, 20, num=n_T//2), np.logspace(1.5, 3, num=n_T//2)]) - ABSOLUTE_ZERO
 T_seafloor = np.concatenate([np.linspace(1, 20, num=n_T//2), np.logspace(1.5, np.log10(1000), num=n_T//2)]) - ABSOLUTE_ZERO
 
-P_grid, T_grid = np.meshgrid(P_seafloor, T_seafloor)
-
 P_surface = 1 * EARTH_ATM
 T_surface = 293
 
@@ -32,8 +34,6 @@ original_comp: dict[str, float] = {
 
 original_C_molality = 0.002
 
-original_alkalinity = reverse_partial_pressure(P_surface, T_surface, (300 * 1e-6) * EARTH_ATM, original_comp, original_C_molality, find_alkalinity=True)
-
 # print(original_alkalinity)
 # print(original_comp)
 
@@ -43,35 +43,47 @@ original_alkalinity = reverse_partial_pressure(P_surface, T_surface, (300 * 1e-6
 
 # print(original_P_CO2 - )
 
-def plot_mineral(mineral: str, dT: int=1, name: str='feedback.png'):
+def mineral_feedback(P_seafloor: np.ndarray, T_seafloor: np.ndarray, mineral: str, alkalinity: float, dT: float=1) -> dict[str, np.ndarray]:
+
+    # surface P_CO2 after the ocean equilibrates with the mineral at the seafloor, and again with a warmer seafloor,
+    # as one PHREEQC deck over the chunk
+    feedback = seafloor_feedback_batch(P_seafloor, T_seafloor, original_comp, [mineral], alkalinity, original_C_molality, P_surface=P_surface, T_surface=T_surface, dT=dT)
+
+    return {'P_CO2_initial': feedback['P_CO2'], 'P_CO2_new': feedback['P_CO2_dT'], 'dP_CO2': feedback['P_CO2_dT'] - feedback['P_CO2']}
 
-    dP_CO2 = np.empty_like(P_grid)
+def sweep_mineral(mineral: str, dT: float=1, path: Union[str, None]=None, chunk_size: int=64, max_workers: Union[int, None]=None) -> str:
 
-    for i_P in tqdm(range(n_P)):
-        for i_T in range(n_T):
+    path = f'sweeps/{mineral}' if path is None else path
 
-            P: float = P_seafloor[i_P]
-            T: float = T_seafloor[i_T]
+    original_alkalinity = reverse_partial_pressure(P_surface, T_surface, (300 * 1e-6) * EARTH_ATM, original_comp, original_C_molality, find_alkalinity=True)
 
-            # equilibrium
+    run_sweep(path, {'P_seafloor': P_seafloor, 'T_seafloor': T_seafloor}, mineral_feedback, kwargs={'mineral': mineral, 'alkalinity': original_alkalinity, 'dT': dT}, chunk_size=chunk_size, vectorized=True, max_workers=max_workers)
 
-            comp, alkalinity, C_molality = seafloor_equilbrium(P, T, original_comp, [mineral], original_alkalinity, original_C_molality)
-            # for i in range(12):
-            #     comp, alkalinity, C_molality = seafloor_equilbrium(P, T, comp, [mineral], alkalinity, C_molality)
+    return path
 
-            # print(comp)
+def refine_mineral(mineral: str, dT: float=1, coarse_shape: tuple[int, int]=(9, 9), max_depth: int=3, variation_tol: Union[float, None]=None, chunk_size: int=16, max_workers: Union[int, None]=None) -> BoundaryResult:
 
-            P_CO2_initial, _ = find_partial_pressures(P_surface, T_surface, comp, alkalinity, C_molality)
+    # traces the dP_CO2 = 0 boundary in (P_seafloor, T_seafloor), starting from a coarse subset of the sweep axes
+    P_coarse = P_seafloor[np.round(np.linspace(0, len(P_seafloor) - 1, coarse_shape[0])).astype(int)]
+    T_coarse = T_seafloor[np.round(np.linspace(0, len(T_seafloor) - 1, coarse_shape[1])).astype(int)]
 
-            new_comp, new_alkalinity, new_C_molality = seafloor_equilbrium(P, T + dT, comp, [mineral], alkalinity, C_molality)
+    original_alkalinity = reverse_partial_pressure(P_surface, T_surface, (300 * 1e-6) * EARTH_ATM, original_comp, original_C_molality, find_alkalinity=True)
+    feedback = partial(mineral_feedback, mineral=mineral, alkalinity=original_alkalinity, dT=dT)
 
-            # print(new_comp)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
 
-            P_CO2_new, _ = find_partial_pressures(P_surface, T_surface, new_comp, new_alkalinity, new_C_molality)
+        def dP_CO2(P: np.ndarray, T: np.ndarray) -> np.ndarray:
+            chunks = [(P[i:i + chunk_size], T[i:i + chunk_size]) for i in range(0, len(P), chunk_size)]
+            return np.concatenate([r['dP_CO2'] for r in executor.map(feedback, *zip(*chunks))])
 
-            dP_CO2[i_T, i_P] = P_CO2_new - P_CO2_initial
+        return refine_sign_boundary(dP_CO2, P_coarse, T_coarse, max_depth, variation_tol)
 
-            # print(P_CO2_new - P_CO2_initial)
+def plot_mineral(mineral: str, path: Union[str, None]=None, boundary: Union[BoundaryResult, None]=None):
+
+    axes, results = load_sweep(f'sweeps/{mineral}' if path is None else path)
+
+    P_grid, T_grid = np.meshgrid(axes['P_seafloor'], axes['T_seafloor'], indexing='ij')
+    dP_CO2 = results['dP_CO2']
 
     vmax = np.max(np.abs(dP_CO2 / 1e5))
     vmin = -vmax
@@ -79,6 +91,9 @@ def plot_mineral(mineral: str, dT: int=1, name: str='feedback.png'):
     plt.contourf(T_grid + ABSOLUTE_ZERO, P_grid / 1e5, dP_CO2 / 1e5, 200, cmap='turbo')
     plt.colorbar(label='Change in $P_{CO2}$ (bar)')
     plt.contour(T_grid + ABSOLUTE_ZERO, P_grid / 1e5, dP_CO2 / 1e5, [0])
+    if boundary is not None:
+        for contour in boundary.contours:
+            plt.plot(contour[:, 1] + ABSOLUTE_ZERO, contour[:, 0] / 1e5, 'k--')
     plt.xlabel('Seafloor Temperature (C)')
     plt.ylabel('Pressure (bar)')
     plt.xscale('log')
@@ -91,4 +106,8 @@ def plot_mineral(mineral: str, dT: int=1, name: str='feedback.png'):
 # Plagioclase: Anorthite, Bytownite, Labradorite, Andesine, Oligoclase, Albite
 # 
 
-plot_mineral('Calcite')
+if __name__ == '__main__':
+
+    sweep_mineral('Calcite')
+    plot_mineral('Calcite')
+
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+REPOSITORY_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_path = os.path.join(REPOSITORY_path, 'benchmarks')
+
+# the model modules import each other as top level modules, as when run from src/KAMINO
+sys.path.insert(0, os.path.join(REPOSITORY_path, 'src', 'KAMINO'))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+@pytest.fixture
+def work_path(tmp_path, monkeypatch):
+
+    # a scratch working directory with the repository's input templates, as the model expects
+    os.symlink(os.path.join(REPOSITORY_path, 'input'), tmp_path / 'input')
+    monkeypatch.chdir(tmp_path)
+
+    return tmp_path
+
+
+@pytest.fixture
+def phreeqc_stand_in(work_path, monkeypatch):
+
+    # PHREEQC runs go to the stand-in executable of the benchmarks, without cache or IPhreeqc
+    from external import phreeqc
+
+    monkeypatch.setattr(phreeqc, 'PHREEQC_path', BENCHMARK_path)
+    monkeypatch.setattr(phreeqc, 'PHREEQC_backend', 'subprocess')
+    monkeypatch.setattr(phreeqc, 'PHREEQC_cache', None)
+
+    return phreeqc
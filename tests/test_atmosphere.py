@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from atmosphere import atmosphere, atmosphere_ensemble
+from planet import planet_ensemble
+
+EARTH_ATM = 101325
+X_GAS = {'N2': 0.78, 'O2': 0.21, 'CO2': 0.01}
+
+
+def test_ensemble_matches_single_atmospheres():
+
+    P_surface = np.array([EARTH_ATM, 2 * EARTH_ATM, 0.5 * EARTH_ATM])
+    ensemble = atmosphere_ensemble(9.81, 5.1e14, P_surface, X_GAS)
+    singles = [atmosphere(9.81, 5.1e14, P, X_GAS) for P in P_surface]
+
+    ensemble.add_species(np.array([1e15, 2e15, 0]), 'CO2')
+    ensemble.set_partial_pressure(np.array([1e3, 2e3, 3e3]), 'O2')
+
+    for single, amount, P_O2 in zip(singles, [1e15, 2e15, 0], [1e3, 2e3, 3e3]):
+        single.add_species(amount, 'CO2')
+        single.set_partial_pressure(P_O2, 'O2')
+
+    for i, single in enumerate(singles):
+        assert ensemble.P_surface[i] == pytest.approx(single.P_surface)
+        assert ensemble.mmw[i] == pytest.approx(single.mmw)
+        assert ensemble.moles[i] == pytest.approx(single.moles)
+        for j, species in enumerate(ensemble.species):
+            assert ensemble.x_gas[i, j] == pytest.approx(single.x_gas[species])
+            assert ensemble.P_gas[i, j] == pytest.approx(single.P_gas[species])
+            assert ensemble.n_gas[i, j] == pytest.approx(single.n_gas[species])
+
+
+def test_member_views_write_through():
+
+    ensemble = atmosphere_ensemble(9.81, 5.1e14, [EARTH_ATM, 2 * EARTH_ATM], X_GAS)
+    untouched = ensemble.P_gas[0].copy()
+
+    member = ensemble[1]
+    member.set_partial_pressure(5e3, 'CO2')
+
+    assert ensemble.P_gas[1, ensemble.species_index['CO2']] == 5e3
+    assert member.P_gas['CO2'] == 5e3
+    assert member.P_surface == ensemble.P_surface[1]
+    np.testing.assert_array_equal(ensemble.P_gas[0], untouched)
+
+    member.x_gas['N2'] = 0.5
+    assert ensemble.x_gas[1, ensemble.species_index['N2']] == 0.5
+
+    with pytest.raises(TypeError):
+        del member.x_gas['N2']
+
+
+def test_planet_surface_pressure_follows_the_ensemble():
+
+    planets = planet_ensemble(6.371e6, 5.97e24, [3000, 4000], [EARTH_ATM, 2 * EARTH_ATM], 0.5)
+    p = planets[1]
+
+    assert p.P_surface == 2 * EARTH_ATM
+    assert planets[1] is p
+
+    planets.atmosphere.add_species(np.array([0, 1e17]), 'CO2')
+
+    assert p.P_surface == planets.P_surface[1] > 2 * EARTH_ATM
+    assert p.P_seafloor == pytest.approx(planets.P_seafloor[1])
+    assert planets[0].P_surface == EARTH_ATM
+
+    p.atmosphere.set_partial_pressure(1e4, 'H2O')
+    assert planets.atmosphere.P_gas[1, planets.atmosphere.species_index['H2O']] == 1e4
@@ -0,0 +1,34 @@
+import pytest
+
+from external import iphreeqc
+
+
+def test_unknown_backend(phreeqc_stand_in):
+    with pytest.raises(ValueError, match='Unknown PHREEQC backend'):
+        phreeqc_stand_in.set_backend('phreeqc-rs')
+
+
+def test_split_database(phreeqc_stand_in):
+
+    database, rest = phreeqc_stand_in._split_database('DATABASE /db/phreeqc.dat\nSOLUTION 1\nEND\n')
+
+    assert database == '/db/phreeqc.dat'
+    assert rest == 'SOLUTION 1\nEND\n'
+
+    with pytest.raises(ValueError):
+        phreeqc_stand_in._split_database('SOLUTION 1\nEND\n')
+
+
+def test_missing_library_falls_back_to_subprocess(phreeqc_stand_in, monkeypatch, tmp_path):
+
+    monkeypatch.setattr(iphreeqc, '_library', None)
+    monkeypatch.setattr(iphreeqc, 'IPhreeqc_library_path', str(tmp_path / 'missing' / 'libiphreeqc.so'))
+
+    expected = phreeqc_stand_in.find_partial_pressures(101325, 288, {'Na': 0.1, 'Cl': 0.1}, 0.002, 0.002)
+
+    phreeqc_stand_in.set_backend('iphreeqc')
+    with pytest.warns(UserWarning, match='falling back'):
+        result = phreeqc_stand_in.find_partial_pressures(101325, 288, {'Na': 0.1, 'Cl': 0.1}, 0.002, 0.002)
+
+    assert result == expected
+    assert phreeqc_stand_in.PHREEQC_backend == 'subprocess'
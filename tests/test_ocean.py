@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from ocean import ocean
+
+EARTH_ATM = 101325
+
+
+def test_setup_widens_a_narrow_bracket(phreeqc_stand_in):
+
+    reference = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+    reference.setup(40, 0.002)
+
+    o = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+    o.setup(40, 0.002, bracket=(2, 3))
+
+    assert o.setup_result.converged
+    assert o.pH == pytest.approx(reference.pH, abs=1e-5)
+    assert o.alkalinity == pytest.approx(reference.alkalinity, rel=1e-5)
+
+
+def test_setup_names_the_bracket_when_no_root(phreeqc_stand_in):
+
+    o = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+
+    with pytest.raises(ValueError, match=r'pH bracket \(2, 3\)'):
+        o.setup(1e12, 0.002, bracket=(2, 3))
+
+
+def test_setup_with_the_analytic_backend_needs_no_phreeqc(work_path, monkeypatch):
+
+    from external import phreeqc
+
+    monkeypatch.setattr(phreeqc, 'PHREEQC_path', str(work_path / 'no_phreeqc'))
+    monkeypatch.setattr(phreeqc, 'PHREEQC_cache', None)
+    monkeypatch.setattr(phreeqc, 'PHREEQC_backend', 'subprocess')
+    phreeqc.set_backend('analytic')
+
+    o = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+    o.setup(40, 0.002)
+
+    assert o.setup_result.converged
+    assert 7 < o.pH < 9
+
+    P_CO2, _ = o.get_partial_pressures()
+    assert P_CO2 == pytest.approx(40, rel=1e-6)
+
+    o.setup(40, 0.002, fused=False)
+    assert P_CO2 == pytest.approx(o.get_partial_pressures()[0], rel=1e-6)
+
+
+def test_column_chemistry_reuses_unchanged_levels(phreeqc_stand_in, monkeypatch):
+
+    runs = []
+    run_phreeqc = phreeqc_stand_in.run_phreeqc
+
+    def counting_run(input_string):
+        runs.append(input_string.count('SOLUTION'))
+        return run_phreeqc(input_string)
+
+    monkeypatch.setattr(phreeqc_stand_in, 'run_phreeqc', counting_run)
+
+    o = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+    o.alkalinity, o.carbon_molality = 0.0023, 0.002
+
+    P = np.linspace(1, 400, 4) * EARTH_ATM
+    T = np.array([288.0, 280.0, 276.0, 275.0])
+
+    first = o.column_chemistry(P, T)
+    assert o.column_chemistry(P, T)['pH'].tolist() == first['pH'].tolist()
+    assert runs == [4]
+
+    T_warm = T.copy()
+    T_warm[2:] += 5
+    warm = o.column_chemistry(P, T_warm)
+
+    assert runs == [4, 2]
+    np.testing.assert_array_equal(warm['pH'][:2], first['pH'][:2])
+
+    # the dict returned earlier is not updated in place
+    assert not np.array_equal(first['pH'], warm['pH'])
+    np.testing.assert_array_equal(first['pH'], o.column_chemistry(P, T)['pH'])
+
+    fresh = ocean(9.81, 5.1e14, 4000, EARTH_ATM, 288, 0.5)
+    fresh.alkalinity, fresh.carbon_molality = 0.0023, 0.002
+    for k, v in fresh.column_chemistry(P, T_warm).items():
+        np.testing.assert_allclose(warm[k], v, rtol=1e-9)
+
+    runs.clear()
+    o.alkalinity = 0.0025
+    o.column_chemistry(P, T)
+    assert runs == [4]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from scipy.integrate import solve_ivp
+
+from ocean_heat_profile import dTdz, temperature_profiles
+
+
+def lsoda_profile(T0, I0, a, h, z):
+
+    # integrated layer by layer with the K of each layer, so the jumps of K at 0.9 h and 1.2 h fall on the ends of a step
+    T = np.empty_like(z)
+    edges = [0, 0.9 * h, 1.2 * h, z[-1]]
+    T_start = T0
+
+    for start, end in zip(edges[:-1], edges[1:]):
+        scale = dTdz(0.5 * (start + end), I0, a, h=h) * np.exp(0.5 * (start + end) / a)
+        inside = (z >= start) & (z < end)
+        solution = solve_ivp(lambda s, T: [scale * np.exp(-s / a)], (start, end), [T_start], method='LSODA', t_eval=np.r_[z[inside], end], rtol=1e-10, atol=1e-12)
+        T[inside] = solution.y[0, :-1]
+        T_start = solution.y[0, -1]
+
+    T[-1] = T_start
+
+    return T
+
+
+@pytest.mark.parametrize('T0, I0, a, h', [(288, 272, 50, 200), (275, 150, 30, 120)])
+def test_profile_matches_lsoda(T0, I0, a, h):
+
+    z = np.linspace(0, 3000, 301)
+
+    np.testing.assert_allclose(temperature_profiles(T0, I0, a, h, z)[0], lsoda_profile(T0, I0, a, h, z), rtol=0, atol=1e-6)
+
+
+def test_profiles_broadcast():
+
+    z = np.linspace(0, 1000, 11)
+    profiles = temperature_profiles([280, 290], 272, [40, 60], 200, z)
+
+    assert profiles.shape == (2, 11)
+    for i, (T0, a) in enumerate([(280, 40), (290, 60)]):
+        np.testing.assert_allclose(profiles[i], temperature_profiles(T0, 272, a, 200, z)[0])
+
+
+def test_default_depths():
+
+    profile = temperature_profiles(288, 272)
+
+    assert profile.shape == (1, 300)
+    np.testing.assert_allclose(profile, temperature_profiles(288, 272, z=np.linspace(0, 3000, num=300)))
@@ -0,0 +1,29 @@
+import numpy as np
+
+COMPOSITION = {'Cl': 0.546, 'Na': 0.469, 'Mg': 0.0528, 'Ca': 0.0103}
+
+
+def test_surface_state_batch_matches_single_runs(phreeqc_stand_in):
+
+    T = np.array([275.0, 290.0, 320.0])
+    alkalinity = np.array([0.002, 0.0023, 0.003])
+
+    batch = phreeqc_stand_in.find_surface_state_batch(101325, T, COMPOSITION, alkalinity, 0.002)
+
+    for i in range(len(T)):
+        single = phreeqc_stand_in.find_surface_state(101325, T[i], COMPOSITION, alkalinity[i], 0.002)
+        np.testing.assert_allclose([b[i] for b in batch], single, rtol=1e-6)
+
+
+def test_seafloor_batch_matches_single_runs(phreeqc_stand_in):
+
+    P = np.array([1e7, 5e7])
+    T = np.array([280.0, 350.0])
+
+    composition, alkalinity, carbon = phreeqc_stand_in.seafloor_equilbrium_batch(P, T, COMPOSITION, ['Calcite'], 0.002, 0.002)
+
+    for i in range(len(P)):
+        single_composition, single_alkalinity, single_carbon = phreeqc_stand_in.seafloor_equilbrium(P[i], T[i], COMPOSITION, ['Calcite'], 0.002, 0.002)
+        np.testing.assert_allclose([alkalinity[i], carbon[i]], [single_alkalinity, single_carbon], rtol=1e-6)
+        for k in COMPOSITION:
+            np.testing.assert_allclose(composition[k][i], single_composition[k], rtol=1e-6)
@@ -0,0 +1,90 @@
+from external.phreeqc_cache import PhreeqcCache, quantize
+
+COMPOSITION = {'Cl': 0.546, 'Na': 0.469, 'Mg': 0.0528, 'Ca': 0.0103}
+
+
+def test_quantize():
+
+    assert quantize(1.23456789, 3) == '1.23e+00'
+    assert quantize(0.0, 3) == '0'
+    assert quantize(float('nan'), 3) == 'nan'
+    assert quantize({'b': 2.0, 'a': [1.0, None, 'x']}, 2) == [['a', ['1.0e+00', None, 'x']], ['b', '2.0e+00']]
+
+
+def test_key_equal_within_significant_digits():
+
+    cache = PhreeqcCache(significant_digits=6)
+
+    key = cache.key('find_surface_state', 'phreeqc.dat', {'T': 288.0, 'composition': COMPOSITION})
+
+    assert cache.key('find_surface_state', 'phreeqc.dat', {'T': 288.0 + 1e-6, 'composition': COMPOSITION}) == key
+    assert cache.key('find_surface_state', 'phreeqc.dat', {'T': 288.01, 'composition': COMPOSITION}) != key
+    assert cache.key('find_surface_state', 'other.dat', {'T': 288.0, 'composition': COMPOSITION}) != key
+    assert cache.key('seafloor_equilbrium', 'phreeqc.dat', {'T': 288.0, 'composition': COMPOSITION}) != key
+
+
+def test_put_get_and_stats():
+
+    cache = PhreeqcCache(maxsize=2)
+
+    cache.put('a', 'phreeqc.dat', (1.0, 2.0))
+    value = cache.get('a')
+    value.append(3.0)
+
+    assert cache.get('a') == [1.0, 2.0]
+    assert cache.get('b') is None
+
+    cache.put('b', 'phreeqc.dat', 1.0)
+    cache.put('c', 'phreeqc.dat', 1.0)
+
+    stats = cache.stats()
+    assert stats['memory_hits'] == 2 and stats['misses'] == 1 and stats['size'] == 2
+    assert cache.get('a') is None
+
+    cache.reset_stats()
+    assert cache.stats()['hits'] == 0
+
+
+def test_disk_persistence_and_invalidate(tmp_path):
+
+    path = str(tmp_path / 'cache.sqlite')
+
+    first = PhreeqcCache(path=path)
+    first.put('a', '/db/phreeqc.dat:1:1', [1.0])
+    first.put('b', '/db/other.dat:1:1', [2.0])
+
+    second = PhreeqcCache(path=path)
+    assert second.get('a') == [1.0]
+    assert second.stats()['disk_hits'] == 1
+
+    second.invalidate('/db/phreeqc.dat')
+    assert second.get('a') is None
+    assert PhreeqcCache(path=path).get('b') == [2.0]
+
+    second.invalidate()
+    assert PhreeqcCache(path=path).get('b') is None
+
+
+def test_cached_surface_state_skips_phreeqc(phreeqc_stand_in, monkeypatch):
+
+    runs = []
+    run_phreeqc = phreeqc_stand_in.run_phreeqc
+
+    def counting_run(input_string):
+        runs.append(input_string)
+        return run_phreeqc(input_string)
+
+    monkeypatch.setattr(phreeqc_stand_in, 'run_phreeqc', counting_run)
+    phreeqc_stand_in.enable_cache(significant_digits=8)
+
+    first = phreeqc_stand_in.find_surface_state(101325, 288, COMPOSITION, 0.0023, 0.002)
+    second = phreeqc_stand_in.find_surface_state(101325, 288 + 1e-9, COMPOSITION, 0.0023, 0.002)
+
+    assert second == first
+    assert len(runs) == 1
+    assert phreeqc_stand_in.cache_stats()['hits'] == 1
+
+    phreeqc_stand_in.invalidate_cache('phreeqc.dat')
+    phreeqc_stand_in.find_surface_state(101325, 288, COMPOSITION, 0.0023, 0.002)
+
+    assert len(runs) == 2
@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+COMPOSITION = {'Cl': 0.546, 'Na': 0.469, 'Mg': 0.0528, 'Ca': 0.0103}
+
+
+def test_parallel_matches_batch_and_cleans_up(phreeqc_stand_in, tmp_path, monkeypatch):
+
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    monkeypatch.setattr(phreeqc_stand_in, 'PHREEQC_scratch_path', str(scratch))
+
+    T = np.linspace(275, 320, 11)
+
+    # threads share the patched module settings; every job still runs in its own directory
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        parallel = phreeqc_stand_in.find_surface_state_parallel(101325, T, COMPOSITION, 0.0023, 0.002, batch_size=2, executor=executor)
+
+    batch = phreeqc_stand_in.find_surface_state_batch(101325, T, COMPOSITION, 0.0023, 0.002)
+
+    for a, b in zip(parallel, batch):
+        np.testing.assert_allclose(a, b, rtol=1e-12)
+
+    assert os.listdir(scratch) == []
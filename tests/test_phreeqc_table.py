@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from ocean import seawater_composition
+from external import phreeqc_table
+
+EARTH_ATM = 101325
+
+# the salinities sum back from their composition to just below 0.25 and just above 0.52
+SALINITY = [0.25, 0.52]
+
+
+@pytest.fixture
+def partial_pressure_table(phreeqc_stand_in, work_path):
+    return phreeqc_table.build_partial_pressure_table(
+        str(work_path / 'partial_pressure'),
+        P=[EARTH_ATM, 2 * EARTH_ATM], T=[280, 290, 300], alkalinity=[1e-3, 1.5e-3, 2e-3], carbon_molality=[3e-3, 4e-3, 5e-3], salinity=SALINITY,
+        n_validation=8, max_workers=1, dtype=np.float64
+    )
+
+
+def test_table_matches_phreeqc_on_the_grid(partial_pressure_table, phreeqc_stand_in):
+
+    composition = seawater_composition(0.52)
+
+    table_state = partial_pressure_table.find_surface_state(EARTH_ATM, 290, composition, 1.5e-3, 4e-3)
+    phreeqc_state = phreeqc_stand_in.find_surface_state(EARTH_ATM, 290, composition, 1.5e-3, 4e-3)
+
+    np.testing.assert_allclose(table_state[:3], phreeqc_state[:3], rtol=1e-6)
+
+
+def test_table_interpolates_between_nodes(partial_pressure_table, phreeqc_stand_in):
+
+    composition = seawater_composition(0.4)
+
+    P_CO2, P_H2O = partial_pressure_table.find_partial_pressures(1.5 * EARTH_ATM, 285, composition, 1.25e-3, 3.5e-3)
+    exact_P_CO2, exact_P_H2O = phreeqc_stand_in.find_partial_pressures(1.5 * EARTH_ATM, 285, composition, 1.25e-3, 3.5e-3)
+
+    assert abs(np.log10(P_CO2 / exact_P_CO2)) < 0.05
+    assert abs(np.log10(P_H2O / exact_P_H2O)) < 0.05
+    assert set(partial_pressure_table.validation) == {'P_CO2', 'P_H2O', 'pH'}
+
+
+@pytest.mark.parametrize('salinity', SALINITY)
+def test_query_at_the_grid_edges(partial_pressure_table, salinity):
+
+    composition = seawater_composition(salinity)
+    assert sum(composition.values()) != salinity
+
+    P_CO2, P_H2O, pH, _ = partial_pressure_table.find_surface_state(EARTH_ATM, 280, composition, 1e-3, 3e-3)
+
+    assert np.isfinite([P_CO2, P_H2O, pH]).all()
+
+    outside = partial_pressure_table.query(P=EARTH_ATM, T=280, alkalinity=1e-3, carbon_molality=3e-3, salinity=salinity * (1 + 1e-6) if salinity == SALINITY[-1] else salinity * (1 - 1e-6))
+    assert np.isnan(outside['P_CO2'])
+
+
+def test_seafloor_table_at_the_grid_edges(phreeqc_stand_in, work_path):
+
+    table = phreeqc_table.build_seafloor_table(
+        str(work_path / 'seafloor'), ['Calcite'],
+        P=[1e7, 2e7], T=[280, 300], alkalinity=[1e-3, 4e-3], carbon_molality=[1e-3, 4e-3], salinity=SALINITY,
+        n_validation=0, max_workers=1, dtype=np.float64
+    )
+
+    for salinity in SALINITY:
+        composition, alkalinity, carbon_molality = table.seafloor_equilbrium(1e7, 280, seawater_composition(salinity), ['Calcite'], 1e-3, 1e-3)
+        assert np.isfinite([alkalinity, carbon_molality, *composition.values()]).all()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import planet as planet_module
+from planet import planet
+
+EARTH_ATM = 101325
+
+
+@pytest.fixture
+def earth(phreeqc_stand_in):
+    p = planet(6.371e6, 5.97e24, 4000, EARTH_ATM, 0.5)
+    p.T_surface = 288
+    return p
+
+
+def test_equilibrate_finds_the_coupled_state(earth, phreeqc_stand_in):
+
+    report = earth.equilibrate(4e18, 0.0023)
+
+    assert report['converged']
+    assert earth.P_CO2 == report['P_CO2'] and earth.P_surface == pytest.approx(report['P_surface'])
+
+    P_CO2, P_H2O, pH, _ = phreeqc_stand_in.find_surface_state(earth.P_surface, 288, earth.ocean.composition, 0.0023, earth.ocean.carbon_molality)
+
+    assert P_CO2 == pytest.approx(earth.P_CO2, rel=1e-5)
+    assert P_H2O == pytest.approx(earth.P_H2O, rel=1e-5)
+    assert earth.ocean.pH == report['pH'] == pH
+    assert earth.ocean.alkalinity == 0.0023
+
+    # all carbon is accounted for between the atmosphere and the ocean
+    assert earth._CO2_moles(earth.P_CO2) + earth.ocean.carbon_molality * earth.M_ocean == pytest.approx(4e18)
+
+
+def test_equilibrate_keeps_the_state_at_the_solution(earth, monkeypatch):
+
+    broyden = planet_module.broyden
+
+    def broyden_with_a_trial_point(f, x0, *args, **kwargs):
+        # the last evaluation away from the solution, as a finite difference step would be
+        result = broyden(f, x0, *args, **kwargs)
+        f(result.x + 0.5)
+        return result
+
+    reference = earth.equilibrate(4e18, 0.0023)
+
+    other = planet(6.371e6, 5.97e24, 4000, EARTH_ATM, 0.5)
+    other.T_surface = 288
+    monkeypatch.setattr(planet_module, 'broyden', broyden_with_a_trial_point)
+    report = other.equilibrate(4e18, 0.0023)
+
+    assert report['pH'] == reference['pH'] == other.ocean.pH
+    assert report['P_surface'] == pytest.approx(reference['P_surface'])
+    assert report['carbon_molality'] == pytest.approx(reference['carbon_molality'])
+
+
+def test_evolve_follows_the_carbon_flux(earth):
+
+    earth.equilibrate(4e18, 0.0023)
+    P_CO2 = earth.P_CO2
+
+    reports = earth.evolve(1e4, 1e3, carbon_flux=lambda t, p: 1e13)
+
+    assert earth.time == 1e4
+    assert earth.carbon_inventory == pytest.approx(4e18 + 1e17)
+    assert earth.P_CO2 > P_CO2
+    assert all(r['converged'] for r in reports if r['accepted'])
+
+
+def test_evolve_raises_when_the_step_fails_at_dt_min(earth, monkeypatch):
+
+    earth.equilibrate(4e18, 0.0023)
+    saved = (earth.carbon_inventory, earth.ocean.alkalinity, earth.ocean.pH, earth.P_CO2, earth.time)
+
+    broyden = planet_module.broyden
+    monkeypatch.setattr(planet_module, 'broyden', lambda *args, **kwargs: broyden(*args, **kwargs)._replace(converged=False))
+
+    with pytest.raises(ValueError, match='did not converge at t = 0'):
+        earth.evolve(100, 10, carbon_flux=lambda t, p: 1e13, dt_min=5)
+
+    assert (earth.carbon_inventory, earth.ocean.alkalinity, earth.ocean.pH, earth.P_CO2, earth.time) == saved
+
+
+def test_equilibrate_validates_its_inputs(earth):
+
+    with pytest.raises(ValueError, match='carbon inventory'):
+        earth.equilibrate(-1, 0.0023)
+
+    earth.T_surface = 0
+    with pytest.raises(ValueError, match='surface temperature'):
+        earth.equilibrate(4e18, 0.0023)
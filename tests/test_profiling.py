@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_enabled', False)
+    monkeypatch.setattr(profiling, 'PROFILING_output', None)
+    profiling.reset()
+    yield profiling
+    profiling.reset()
+
+
+def test_disabled_records_nothing(profiler):
+
+    with profiler.timer('stage'):
+        pass
+    profiler.count('counter', 3)
+
+    assert profiler.report() == {'timers': {}, 'counters': {}}
+
+
+def test_timers_and_counters(profiler):
+
+    profiler.enable()
+
+    @profiler.timed('decorated')
+    def add(a, b):
+        return a + b
+
+    for _ in range(3):
+        with profiler.timer('stage'):
+            pass
+    assert add(1, 2) == 3
+    profiler.count('counter')
+    profiler.count('counter', 4)
+
+    report = profiler.report()
+    assert report['timers']['stage']['calls'] == 3
+    assert report['timers']['decorated']['calls'] == 1
+    assert report['timers']['stage']['max'] <= report['timers']['stage']['total']
+    assert report['counters'] == {'counter': 5}
+
+
+def test_export_json(profiler, tmp_path):
+
+    profiler.enable(str(tmp_path / 'profile.json'))
+    profiler.count('counter')
+
+    profiler.export()
+
+    with open(tmp_path / 'profile.json') as file:
+        assert json.load(file)['counters'] == {'counter': 1}
+
+
+def test_phreeqc_stages_with_stand_in(profiler, phreeqc_stand_in):
+
+    profiler.enable()
+
+    P_CO2, P_H2O = phreeqc_stand_in.find_partial_pressures(101325, 288, {'Na': 0.1, 'Cl': 0.1}, 0.002, 0.002)
+
+    assert P_CO2 > 0 and P_H2O > 0
+    report = profiler.report()
+    assert report['counters']['phreeqc.runs'] == 1
+    assert {'phreeqc.write_input', 'phreeqc.subprocess', 'phreeqc.read_output'} <= set(report['timers'])
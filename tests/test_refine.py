@@ -0,0 +1,55 @@
+import numpy as np
+
+from refine import refine_sign_boundary
+
+
+def circle(x, y):
+    return x ** 2 + y ** 2 - 1
+
+
+def test_circle_contour_is_accurate():
+
+    axis = np.linspace(-1.5, 1.5, 7)
+    result = refine_sign_boundary(circle, axis, axis, max_depth=4)
+
+    assert len(result.contours) == 1
+    contour = result.contours[0]
+    np.testing.assert_allclose(np.hypot(contour[:, 0], contour[:, 1]), 1, atol=2e-3)
+
+    # the contour goes all the way round and closes on itself
+    angles = np.unwrap(np.arctan2(contour[:, 1], contour[:, 0]))
+    assert abs(abs(angles[-1] - angles[0]) - 2 * np.pi) < 1e-9
+
+
+def test_refinement_is_cheaper_than_the_fine_grid():
+
+    axis = np.linspace(-1.5, 1.5, 7)
+    result = refine_sign_boundary(circle, axis, axis, max_depth=4)
+
+    fine = (6 * 2 ** 4 + 1) ** 2
+    assert result.evaluations < fine / 4
+    assert result.evaluations == len(result.values) == len(result.x)
+    np.testing.assert_allclose(result.values, circle(result.x, result.y))
+
+
+def test_deeper_refinement_is_more_accurate():
+
+    axis = np.linspace(-1.5, 1.5, 5)
+
+    errors = []
+    for depth in (1, 3, 5):
+        contour = refine_sign_boundary(circle, axis, axis, max_depth=depth).contours[0]
+        errors.append(np.max(np.abs(np.hypot(contour[:, 0], contour[:, 1]) - 1)))
+
+    assert errors[0] > errors[1] > errors[2]
+
+
+def test_uneven_axes_keep_their_spacing():
+
+    x_axis = np.array([-1.5, -0.5, 0.0, 2.0])
+    y_axis = np.array([-1.5, 0.25, 1.5])
+    result = refine_sign_boundary(circle, x_axis, y_axis, max_depth=3)
+
+    contour = np.concatenate(result.contours)
+    np.testing.assert_allclose(np.hypot(contour[:, 0], contour[:, 1]), 1, atol=2e-2)
+    assert result.x.min() == -1.5 and result.x.max() == 2.0
@@ -0,0 +1,42 @@
+import numpy as np
+
+COMPOSITION = {'Cl': 0.546, 'Na': 0.469, 'Mg': 0.0528, 'Ca': 0.0103}
+MINERALS = ['Calcite']
+
+
+def test_feedback_matches_separate_runs(phreeqc_stand_in):
+
+    P = np.array([1e7, 5e7])
+    T = np.array([280.0, 350.0])
+
+    feedback = phreeqc_stand_in.seafloor_feedback_batch(P, T, COMPOSITION, MINERALS, 0.002, 0.002, P_surface=101325, T_surface=293, dT=2)
+    composition, alkalinity, carbon_molality = phreeqc_stand_in.seafloor_equilbrium_batch(P, T, COMPOSITION, MINERALS, 0.002, 0.002)
+
+    np.testing.assert_allclose(feedback['alkalinity'], alkalinity, rtol=1e-6)
+    np.testing.assert_allclose(feedback['carbon_molality'], carbon_molality, rtol=1e-6)
+
+    for i in range(len(P)):
+        surface = {k: v[i] for k, v in composition.items()}
+        P_CO2, _ = phreeqc_stand_in.find_partial_pressures(101325, 293, surface, alkalinity[i], carbon_molality[i])
+        np.testing.assert_allclose(feedback['P_CO2'][i], P_CO2, rtol=1e-4)
+
+        _, warm_alkalinity, warm_carbon_molality = phreeqc_stand_in.seafloor_equilbrium(P[i], T[i] + 2, surface, MINERALS, alkalinity[i], carbon_molality[i])
+        warm_P_CO2, _ = phreeqc_stand_in.find_partial_pressures(101325, 293, surface, warm_alkalinity, warm_carbon_molality)
+        np.testing.assert_allclose(feedback['P_CO2_dT'][i], warm_P_CO2, rtol=1e-3)
+
+
+def test_feedback_derivatives(phreeqc_stand_in):
+
+    P = np.array([1e7, 5e7])
+    T = np.array([280.0, 350.0])
+
+    feedback = phreeqc_stand_in.seafloor_feedback_batch(P, T, COMPOSITION, MINERALS, 0.002, 0.002, dT=2, dP=1e6)
+
+    assert set(feedback) == {'P_CO2', 'alkalinity', 'carbon_molality', 'P_CO2_dT', 'dP_CO2_dT', 'P_CO2_dP', 'dP_CO2_dP'}
+    np.testing.assert_allclose(feedback['dP_CO2_dT'], (feedback['P_CO2_dT'] - feedback['P_CO2']) / 2)
+    np.testing.assert_allclose(feedback['dP_CO2_dP'], (feedback['P_CO2_dP'] - feedback['P_CO2']) / 1e6)
+
+    without_dP = phreeqc_stand_in.seafloor_feedback_batch(P, T, COMPOSITION, MINERALS, 0.002, 0.002, dT=2)
+
+    assert 'dP_CO2_dP' not in without_dP
+    np.testing.assert_allclose(without_dP['dP_CO2_dT'], feedback['dP_CO2_dT'], rtol=1e-6)
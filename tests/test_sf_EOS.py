@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('seafreeze')
+
+from external.sf_EOS import make_adiabat, make_adiabat_batch
+
+EARTH_ATM = 101325
+
+
+def test_adiabat_batch_matches_make_adiabat():
+
+    P, T, rho = make_adiabat(EARTH_ATM, 280, 4e7, 0.5, 5)
+    P_batch, T_batch, rho_batch = make_adiabat_batch(EARTH_ATM, 280, 4e7, 0.5, 5)
+
+    np.testing.assert_allclose(P_batch, P)
+    np.testing.assert_allclose(T_batch, T, atol=1e-6)
+    np.testing.assert_allclose(rho_batch, rho, rtol=1e-8)
+
+
+def test_adiabat_batch_broadcasts():
+
+    P_batch, T_batch, rho_batch = make_adiabat_batch(EARTH_ATM, [280, 300], 4e7, [0, 0.5], 8)
+
+    assert P_batch.shape == T_batch.shape == rho_batch.shape == (2, 8)
+
+    for i, (T_start, salinity) in enumerate([(280, 0), (300, 0.5)]):
+        _, T, _ = make_adiabat_batch(EARTH_ATM, T_start, 4e7, salinity, 8)
+        np.testing.assert_allclose(T_batch[i], T, atol=1e-6)
+
+
+def test_unconverged_levels_are_nan():
+
+    with pytest.warns(UserWarning, match='did not converge'):
+        _, T, rho = make_adiabat_batch(EARTH_ATM, 280, 4e7, 0.5, 8, xtol=0, maxiter=1)
+
+    assert T[0] == 280
+    assert np.isnan(T[1:]).all() and np.isnan(rho[1:]).all()
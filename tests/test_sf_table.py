@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('seafreeze')
+
+from external import sf_EOS, sf_table
+
+P_GRID = np.geomspace(1e5, 1e8, 13).tolist()
+T_GRID = [280, 290, 300]
+SALINITY_GRID = [0, 0.5]
+
+
+def test_default_grid_stays_within_seafreeze():
+    assert sf_table.DEFAULT_P[-1] <= sf_table.SEAFREEZE_P_MAX
+
+
+def test_table_lookup_matches_seafreeze(tmp_path):
+
+    table = sf_table.build_table(str(tmp_path / 'eos'), P_GRID, T_GRID, SALINITY_GRID)
+
+    P, T, salinity = np.array([3e6, 5e7]), np.array([285, 297]), np.array([0.25, 0.5])
+    interpolated = table.lookup(P, T, salinity, ('rho', 'Cp'))
+
+    np.testing.assert_allclose(interpolated['rho'], sf_EOS.EOS(P, T, salinity, 'density'), rtol=1e-3)
+    np.testing.assert_allclose(interpolated['Cp'], sf_EOS.EOS(P, T, salinity, 'heat_capacity'), rtol=1e-2)
+
+    point = table.lookup_point(3e6, 285, 0.25, ('rho',))
+    assert point['rho'] == pytest.approx(interpolated['rho'][0], rel=1e-12)
+    assert table.lookup_point(1e9, 285, 0.25, ('rho',)) is None
+
+
+def test_nodes_above_the_pressure_limit_are_masked(tmp_path):
+
+    path = str(tmp_path / 'eos')
+    table = sf_table.build_table(path, P_GRID + [9e9], T_GRID, SALINITY_GRID)
+
+    assert np.isnan(table.values[-1]).all()
+    assert (table.phases[-1] == -1).all()
+    assert np.isfinite(table.values[:-1]).all()
+
+    with pytest.raises(ValueError, match='SeaFreeze tables need pressures'):
+        sf_table.build_table(str(tmp_path / 'high'), [9e9, 1e10], T_GRID, SALINITY_GRID)
+
+
+def test_tables_with_values_above_the_limit_are_rebuilt(tmp_path):
+
+    path = str(tmp_path / 'eos')
+    sf_table.build_table(path, P_GRID + [9e9], T_GRID, SALINITY_GRID)
+
+    # as written before the limit was applied
+    values = np.load(f'{path}.npy')
+    values[-1] = values[-2]
+    np.save(f'{path}.npy', values)
+
+    table = sf_table.load_table(path)
+
+    np.testing.assert_array_equal(table.P, P_GRID + [9e9])
+    assert np.isnan(table.values[-1]).all()
@@ -0,0 +1,82 @@
+import numpy as np
+
+from scipy.optimize import fsolve
+
+from solvers import broyden, finite_difference_jacobian, safeguarded_secant
+
+
+def test_secant_linear_root():
+
+    result = safeguarded_secant(lambda x: 2 * x - 3, 0.0, 1.0)
+
+    assert result.converged
+    np.testing.assert_allclose(result.root, 1.5, atol=1e-8)
+    assert result.function_calls <= 4
+
+
+def test_secant_keeps_to_the_sign_change():
+
+    # the secant step of arctan overshoots far from the root, the bracket of the sign change holds it
+    result = safeguarded_secant(np.arctan, -3.0, 10.0, xtol=1e-10)
+
+    assert result.converged
+    np.testing.assert_allclose(result.root, 0.0, atol=1e-8)
+
+
+def test_secant_clipped_to_bracket():
+
+    result = safeguarded_secant(lambda x: x ** 3 - 8, 5.0, 6.0, bracket=(0, 10))
+
+    assert result.converged
+    np.testing.assert_allclose(result.root, 2.0, atol=1e-7)
+
+
+def test_secant_reports_a_missed_bracket():
+
+    result = safeguarded_secant(lambda x: x - 5, 1.0, 2.0, bracket=(0, 3))
+
+    assert not result.converged
+    assert result.root == 3.0
+
+
+def system(x):
+    return np.array([x[0] ** 2 + x[1] ** 2 - 4, np.exp(x[0]) + x[1] - 1])
+
+SOLUTION = fsolve(system, [-2.0, 1.0], xtol=1e-14)
+
+
+def test_broyden_solves_a_2d_system():
+
+    result = broyden(system, [-2.0, 1.0], xtol=1e-12, ftol=1e-12)
+
+    assert result.converged
+    np.testing.assert_allclose(result.x, SOLUTION, atol=1e-6)
+    np.testing.assert_allclose(result.fx, system(result.x))
+    assert result.jacobian_evaluations == 1
+
+
+def test_broyden_reuses_a_jacobian():
+
+    first = broyden(system, [-2.0, 1.0], xtol=1e-12, ftol=1e-12)
+    second = broyden(system, first.x + 0.01, first.jacobian, xtol=1e-12, ftol=1e-12)
+
+    assert second.converged
+    assert second.jacobian_evaluations == 0
+    np.testing.assert_allclose(second.x, SOLUTION, atol=1e-6)
+
+
+def test_broyden_rebuilds_a_stale_jacobian():
+
+    result = broyden(system, [-2.0, 1.0], -np.eye(2), xtol=1e-12, ftol=1e-12)
+
+    assert result.converged
+    assert result.jacobian_evaluations >= 1
+    np.testing.assert_allclose(result.x, SOLUTION, atol=1e-6)
+
+
+def test_finite_difference_jacobian():
+
+    x = np.array([-2.0, 1.0])
+    jacobian = finite_difference_jacobian(system, x, system(x), step=1e-7)
+
+    np.testing.assert_allclose(jacobian, [[2 * x[0], 2 * x[1]], [np.exp(x[0]), 1]], rtol=1e-5)
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pytest
+
+from sweep import completed_chunks, load_sweep, run_sweep
+
+GRID = {'x': [0.0, 1.0, 2.0], 'y': [10.0, 20.0]}
+
+calls = []
+
+
+def surface(x, y, scale=1.0):
+    calls.append((x, y))
+    return {'sum': scale * (x + y), 'product': scale * x * y}
+
+
+def surface_vectorized(x, y, scale=1.0):
+    return {'sum': scale * (x + y), 'product': scale * x * y}
+
+
+def test_sweep_fills_the_grid(tmp_path):
+
+    outputs = run_sweep(str(tmp_path / 'sweep'), GRID, surface_vectorized, kwargs={'scale': 2.0}, chunk_size=4, vectorized=True, max_workers=1)
+
+    x, y = np.meshgrid(GRID['x'], GRID['y'], indexing='ij')
+    np.testing.assert_allclose(outputs['sum'], 2 * (x + y))
+    np.testing.assert_allclose(outputs['product'], 2 * x * y)
+
+
+def test_sweep_resumes_at_missing_chunks(tmp_path):
+
+    path = str(tmp_path / 'sweep')
+    run_sweep(path, GRID, surface, chunk_size=2, max_workers=1)
+    assert completed_chunks(path) == [0, 1, 2]
+
+    os.remove(os.path.join(path, 'chunk_000001.npz'))
+    _, partial = load_sweep(path)
+    assert np.isnan(partial['sum']).sum() == 2
+
+    calls.clear()
+    outputs = run_sweep(path, GRID, surface, chunk_size=2, max_workers=1)
+
+    assert calls == [(1.0, 10.0), (1.0, 20.0)]
+    assert not np.isnan(outputs['sum']).any()
+
+
+def test_sweep_rejects_a_different_sweep(tmp_path):
+
+    path = str(tmp_path / 'sweep')
+    run_sweep(path, GRID, surface_vectorized, kwargs={'scale': 2.0}, chunk_size=4, vectorized=True, max_workers=1)
+
+    with pytest.raises(ValueError, match='different sweep'):
+        run_sweep(path, GRID, surface_vectorized, kwargs={'scale': 3.0}, chunk_size=4, vectorized=True, max_workers=1)
+    with pytest.raises(ValueError, match='different sweep'):
+        run_sweep(path, {'x': [0.0, 1.0], 'y': [10.0, 20.0]}, surface_vectorized, kwargs={'scale': 2.0}, chunk_size=4, vectorized=True, max_workers=1)
+    with pytest.raises(ValueError, match='different sweep'):
+        run_sweep(path, GRID, surface, kwargs={'scale': 2.0}, chunk_size=4, vectorized=True, max_workers=1)
+
+    # the same sweep under another name
+    run_sweep(path, GRID, surface, kwargs={'scale': 2.0}, chunk_size=4, vectorized=True, max_workers=1, sweep_name='surface_vectorized')
+
+
+def test_sweep_matches_floats_to_rtol(tmp_path):
+
+    path = str(tmp_path / 'sweep')
+    run_sweep(path, GRID, surface_vectorized, kwargs={'scale': np.float64(2.0)}, chunk_size=4, vectorized=True, max_workers=1)
+
+    run_sweep(path, {'x': np.array(GRID['x']) * (1 + 1e-9), 'y': GRID['y']}, surface_vectorized, kwargs={'scale': 2.0 * (1 + 1e-9)}, chunk_size=4, vectorized=True, max_workers=1)
+
+    with pytest.raises(ValueError, match='different sweep'):
+        run_sweep(path, GRID, surface_vectorized, kwargs={'scale': 2.0 * (1 + 1e-9)}, chunk_size=4, vectorized=True, max_workers=1, rtol=1e-12)